@@ -0,0 +1,130 @@
+## { SCRIPT
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+import argparse
+from collections.abc import Callable
+from pathlib import Path
+import re
+import time
+from typing import cast
+
+## local
+from setup import editors
+
+##
+## === BENCHMARK CONFIG
+##
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+MODULES_GLOB = "editors/*/*/*.jsonc"
+
+##
+## === BENCHMARK HELPERS
+##
+
+
+def filter_with_regex_passes(
+    content: str,
+) -> str:
+    """The three whole-string regex passes `filter_jsonc_comments` replaced; strips `//` inside strings too."""
+    content = re.sub(r"/\*[\s\S]*?\*/", "", content)
+    content = re.sub(r"//[^\n\r]*", "", content)
+    content = re.sub(r",(\s*[}\]])", r"\1", content)
+    return content
+
+
+def build_inputs(
+    *,
+    modules: list[str],
+    repeat: int,
+    comment_lines: int,
+) -> dict[str, str]:
+    """Join the repo's settings and keymap modules `repeat` times, and build a module commenting every entry."""
+    commented_entries = "".join(f'  "key{index}": "value {index}", // note {index}\n' for index in range(comment_lines))
+    return {
+        f"repo modules x{repeat}": "\n".join(modules) * repeat,
+        f"comment on every line x{comment_lines}": "{\n" + commented_entries + '  "end": 1,\n}\n',
+    }
+
+
+def time_best(
+    *,
+    filter_content: Callable[[str], str],
+    content: str,
+    rounds: int,
+) -> float:
+    """Return the best wall time of `rounds` calls, in milliseconds."""
+    best_seconds = float("inf")
+    for _ in range(rounds):
+        start_time = time.perf_counter()
+        filter_content(content)
+        best_seconds = min(best_seconds, time.perf_counter() - start_time)
+    return best_seconds * 1000
+
+
+##
+## === PROGRAM MAIN
+##
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time `filter_jsonc_comments` against the regex passes it replaced.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=200,
+        help="Join the repo's jsonc modules this many times (default: 200)",
+    )
+    parser.add_argument(
+        "--comment-lines",
+        type=int,
+        default=60_000,
+        help="Entries in the module that comments every line (default: 60000)",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=9,
+        help="Report the best of this many runs (default: 9)",
+    )
+    args = parser.parse_args()
+    rounds = cast(int, args.rounds)
+    inputs = build_inputs(
+        modules=[path.read_text() for path in sorted(ROOT_DIR.glob(MODULES_GLOB))],
+        repeat=cast(int, args.repeat),
+        comment_lines=cast(int, args.comment_lines),
+    )
+    for input_name, content in inputs.items():
+        ## no string in these inputs holds `//` or `/*`, so both paths must produce the same text
+        if editors.filter_jsonc_comments(content) != filter_with_regex_passes(content):
+            raise RuntimeError(f"the filters disagree on {input_name}")
+        regex_ms = time_best(
+            filter_content=filter_with_regex_passes,
+            content=content,
+            rounds=rounds,
+        )
+        scan_ms = time_best(
+            filter_content=editors.filter_jsonc_comments,
+            content=content,
+            rounds=rounds,
+        )
+        print(
+            f"{input_name} ({len(content) / 1e6:.1f} MB): "
+            f"regex passes {regex_ms:.1f} ms, forward pass {scan_ms:.1f} ms",
+        )
+
+
+##
+## === ENTRY POINT
+##
+
+if __name__ == "__main__":
+    main()
+
+## } SCRIPT
@@ -8,16 +8,21 @@
 import argparse
 from dataclasses import dataclass
 from enum import Enum, auto
+import functools
+import hashlib
 import json
+import os
 from pathlib import Path
 import re
-import shutil
+import subprocess
 import sys
+import time
 from typing import cast
 
 ## local
 from utils import load_profiles
-from utils import log_messages, apply_shell_actions
+from utils import cache_extensions, cache_modules, clone_repos, fingerprint_runs, log_messages, apply_shell_actions
+from utils import find_executables, record_links, schedule_actions, write_files
 
 ##
 ## === EDITOR CONFIG
@@ -29,8 +34,27 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 DOTFILES_DIR = ROOT_DIR / "editors"
 CONFIG_DIR = HOME_DIR / ".config"
 
+DOOM_SYNC_FINGERPRINT_FILE = record_links.STATE_DIR / "doom-sync.fingerprint"
+LAZY_PLUGINS_DIR = Path(os.environ.get("XDG_DATA_HOME") or HOME_DIR / ".local" / "share") / "nvim" / "lazy"
+## `{}` is the `owner/repo` of a plugin; point it at local bare repos to test without the network
+LAZY_PLUGIN_URL = os.environ.get("DOTFILES_LAZY_PLUGIN_URL") or "https://github.com/{}"
+
+WATCH_POLL_SECONDS = 0.05
+WATCH_DEBOUNCE_SECONDS = 0.1
+
 _log_message = log_messages.make_logger(SCRIPT_NAME)
 
+## JSON strings cannot hold raw line breaks, so an unterminated one stops at its line end
+_STRING_PATTERN = re.compile(r'"[^"\\\n\r]*+(?:\\.[^"\\\n\r]*+)*+"')
+_TRAILING_COMMA_PATTERN = re.compile(r",(?=\s*+[}\]])")
+_CLOSING_BRACKET_AHEAD_PATTERN = re.compile(r"\s*+[}\]]")
+## a lazy.nvim spec string (`"owner/repo"` or a GitHub url), optionally followed by the spec's `name = "..."`
+_LAZY_PLUGIN_SPEC_PATTERN = re.compile(
+    r'"(?:https://github\.com/)?([\w.-]+/[\w.-]+?)(?:\.git)?"(?:\s*,\s*name\s*=\s*"([^"]+)")?',
+)
+## a `build = ...` field among the fields after a spec string, before the next table opens or closes
+_LAZY_PLUGIN_BUILD_PATTERN = re.compile(r'(?:[^{}"]|"[^"]*")*?\bbuild\s*=')
+
 _VSCODE_TARGET_DIR = (
     Path.home() / "Library/Application Support/Code/User" if sys.platform == "darwin" else Path.home() /
     ".config/Code/User"
@@ -41,13 +65,6 @@ class PostSetup(Enum):
     DOOM_SYNC = auto()
 
 
-@dataclass
-class RepoConfig:
-    name: str
-    url: str
-    output: Path
-
-
 @dataclass
 class EditorConfig:
     name: str
@@ -58,7 +75,8 @@ class EditorConfig:
     files: dict[str, str] | None = None
     extensions: Path | None = None
     mac_app: str | None = None
-    clone_repo: RepoConfig | None = None
+    clone_repo: clone_repos.RepoConfig | None = None
+    lock_file: Path | None = None
     post_setup: PostSetup | None = None
 
 
@@ -72,7 +90,7 @@ EDITORS: dict[str, EditorConfig] = {
         target_dir=_VSCODE_TARGET_DIR,
         files={
             "settings": "dict",
-            "keybindings": "list",
+            "keybindings": "indexed-list",
         },
         extensions=DOTFILES_DIR / "vscode" / "extensions.txt",
     ),
@@ -83,6 +101,7 @@ EDITORS: dict[str, EditorConfig] = {
         brew="neovim",
         dotfiles_dir=DOTFILES_DIR / "nvim",
         target_dir=CONFIG_DIR / "nvim",
+        lock_file=DOTFILES_DIR / "nvim" / "lazy-lock.json",
     ),
     "emacs":
     EditorConfig(
@@ -92,7 +111,7 @@ EDITORS: dict[str, EditorConfig] = {
         mac_app="Emacs.app",
         dotfiles_dir=DOTFILES_DIR / "emacs",
         target_dir=HOME_DIR / ".doom.d",
-        clone_repo=RepoConfig(
+        clone_repo=clone_repos.RepoConfig(
             name="Doom-Emacs",
             url="https://github.com/doomemacs/doomemacs",
             output=CONFIG_DIR / "emacs",
@@ -108,7 +127,7 @@ EDITORS: dict[str, EditorConfig] = {
         target_dir=Path.home() / ".config/zed/",
         files={
             "settings": "dict",
-            "keymap": "list",
+            "keymap": "indexed-list",
         },
     ),
 }
@@ -121,10 +140,126 @@ EDITORS: dict[str, EditorConfig] = {
 def filter_jsonc_comments(
     content: str,
 ) -> str:
-    content = re.sub(r'/\*[\s\S]*?\*/', '', content)  # remove block comments
-    content = re.sub(r'//[^\n\r]*', '', content)  # remove line comments
-    content = re.sub(r',(\s*[}\]])', r'\1', content)  # remove trailing commas
-    return content
+    """
+  Strip comments and trailing commas from JSONC in one forward pass, leaving string values untouched.
+
+  The pass jumps between the next `//`, `/*` and comma before a closing bracket, and decides whether each sits in a
+  string from the quotes and escapes since the last position known to be outside one. The text between removals is
+  copied once into the result.
+  """
+    content_length = len(content)
+    has_escapes = "\\" in content
+    kept_spans: list[str] = []
+    copy_from = 0
+    outside_from = 0  # known to be outside any string or comment
+    line_comment_start = _find_or_end(content=content, token="//", start=0)
+    block_comment_start = _find_or_end(content=content, token="/*", start=0)
+    comma_match = _TRAILING_COMMA_PATTERN.search(content)
+    comma_start = content_length if comma_match is None else comma_match.start()
+    while (position := min(line_comment_start, block_comment_start, comma_start)) < content_length:
+        if has_escapes and content.find("\\", outside_from, position) != -1:
+            ## an escaped quote breaks quote parity, so walk the strings on this line
+            string_end = _find_enclosing_string_end(
+                content=content,
+                scan_from=max(content.rfind("\n", outside_from, position) + 1, outside_from),
+                position=position,
+            )
+        elif content.count('"', outside_from, position) % 2 == 1:
+            string_end = _find_string_end(
+                content=content,
+                quote_start=content.rfind('"', outside_from, position),
+            )
+        else:
+            string_end = None
+        if string_end is not None:
+            outside_from = string_end
+        else:
+            if position == comma_start:
+                outside_from = position + 1
+            elif position == line_comment_start:
+                outside_from = content.find("\n", position)
+                if outside_from == -1:
+                    outside_from = content_length
+            else:
+                block_end = content.find("*/", position + 2)
+                if block_end == -1:
+                    ## an unterminated block comment is left for `json.loads` to report
+                    break
+                outside_from = block_end + 2
+            kept_spans.append(content[copy_from:position])
+            copy_from = outside_from
+            if position != comma_start and _CLOSING_BRACKET_AHEAD_PATTERN.match(content, outside_from):
+                ## a comma kept before this comment is trailing too, e.g. `1, // last\n]`
+                _remove_trailing_comma(kept_spans)
+        if line_comment_start < outside_from:
+            line_comment_start = content.find("//", outside_from)
+            if line_comment_start == -1:
+                line_comment_start = content_length
+        if block_comment_start < outside_from:
+            block_comment_start = content.find("/*", outside_from)
+            if block_comment_start == -1:
+                block_comment_start = content_length
+        if comma_start < outside_from:
+            comma_match = _TRAILING_COMMA_PATTERN.search(content, outside_from)
+            comma_start = content_length if comma_match is None else comma_match.start()
+    if not kept_spans:
+        return content
+    kept_spans.append(content[copy_from:])
+    return "".join(kept_spans)
+
+
+def _find_or_end(
+    *,
+    content: str,
+    token: str,
+    start: int,
+) -> int:
+    """Return the offset of the next `token` from `start`, or the length of `content` when there is none."""
+    offset = content.find(token, start)
+    return len(content) if offset == -1 else offset
+
+
+def _find_string_end(
+    *,
+    content: str,
+    quote_start: int,
+) -> int:
+    """Return the end of the string literal opened at `quote_start`; an unterminated one runs to the end."""
+    string_match = _STRING_PATTERN.match(content, quote_start)
+    return len(content) if string_match is None else string_match.end()
+
+
+def _find_enclosing_string_end(
+    *,
+    content: str,
+    scan_from: int,
+    position: int,
+) -> int | None:
+    """Return the end of the string literal containing `position`, or `None` when it is outside every string."""
+    while (quote_start := content.find('"', scan_from, position)) != -1:
+        scan_from = _find_string_end(content=content, quote_start=quote_start)
+        if scan_from > position:
+            return scan_from
+    return None
+
+
+def _remove_trailing_comma(
+    kept_spans: list[str],
+) -> None:
+    """Drop a comma that ends the kept text, looking back past spans that are only whitespace."""
+    for index in range(len(kept_spans) - 1, -1, -1):
+        span = kept_spans[index]
+        stripped = span.rstrip()
+        if stripped:
+            if stripped[-1] == ",":
+                kept_spans[index] = stripped[:-1] + span[len(stripped):]
+            return
+
+
+def parse_jsonc_module(
+    content: str,
+) -> object:
+    return cast(object, json.loads(filter_jsonc_comments(content)))
 
 
 def merge_config_modules(
@@ -135,93 +270,412 @@ def merge_config_modules(
     if not modules_dir.exists():
         _log_message(f"Skipping. No module directory found: {modules_dir}")
         return None
+    try:
+        return _merge_cached_modules(
+            modules_dir=modules_dir,
+            mode=mode,
+        )
+    finally:
+        cache_modules.save_module_cache()
+
+
+def _merge_cached_modules(
+    *,
+    modules_dir: Path,
+    mode: str,
+) -> dict[str, object] | list[object] | None:
+    ## unchanged modules come from the parsed-module cache at the cost of one `stat`
     if mode == "dict":
         merged_dict: dict[str, object] = {}
         for module in sorted(modules_dir.glob("*.jsonc")):
-            with module.open("r", encoding="utf-8") as f:
-                raw_content = f.read()
-                filtered_content = filter_jsonc_comments(raw_content)
-                dict_content = cast(object, json.loads(filtered_content))
-                if not isinstance(dict_content, dict):
-                    _log_message(f"Skipping. Expected object config in: {module}")
-                    return None
-                merged_dict.update(cast(dict[str, object], dict_content))
+            dict_content = cache_modules.load_module(
+                module,
+                parse=parse_jsonc_module,
+            )
+            if not isinstance(dict_content, dict):
+                _log_message(f"Skipping. Expected object config in: {module}")
+                return None
+            merged_dict.update(cast(dict[str, object], dict_content))
         return merged_dict
     elif mode == "list":
         merged_list: list[object] = []
         for module in sorted(modules_dir.glob("*.jsonc")):
-            with module.open("r", encoding="utf-8") as f:
-                raw_content = f.read()
-                filtered_content = filter_jsonc_comments(raw_content)
-                list_content = cast(object, json.loads(filtered_content))
-                if not isinstance(list_content, list):
-                    _log_message(f"Skipping. Expected list config in: {module}")
-                    return None
-                merged_list.extend(cast(list[object], list_content))
+            list_content = cache_modules.load_module(
+                module,
+                parse=parse_jsonc_module,
+            )
+            if not isinstance(list_content, list):
+                _log_message(f"Skipping. Expected list config in: {module}")
+                return None
+            merged_list.extend(cast(list[object], list_content))
         return merged_list
+    elif mode == "indexed-list":
+        module_lists: list[tuple[Path, list[object]]] = []
+        for module in sorted(modules_dir.glob("*.jsonc")):
+            list_content = cache_modules.load_module(
+                module,
+                parse=parse_jsonc_module,
+            )
+            if not isinstance(list_content, list):
+                _log_message(f"Skipping. Expected list config in: {module}")
+                return None
+            module_lists.append((module, cast(list[object], list_content)))
+        return merge_keybindings(module_lists)
     else:
         _log_message(f"Error: Unsupported mode `{mode}`")
         return None
 
 
+def merge_keybindings(
+    module_lists: list[tuple[Path, list[object]]],
+) -> list[object]:
+    """
+  Merge keybinding lists so each binding appears once, with later modules overriding earlier ones.
+
+  VS Code entries are indexed by `(key, when)`; removal entries (`-command`) also include the command, since
+  several can target one chord. An adjacent Zed entry whose other fields (`context`, `use_key_equivalents`, ...)
+  match the previous one is combined into it, with `bindings` indexed by chord. Every other entry keeps its
+  position, since both editors give later entries precedence. Each override of a different binding is logged with
+  the module that won. Indexing keeps the merge O(n).
+  """
+    merged_entries: list[object] = []
+    removed_indexes: set[int] = set()
+    vscode_bindings: dict[tuple[str, str, str], tuple[Path, dict[str, object], int]] = {}
+    zed_actions: dict[tuple[str, str], tuple[Path, object]] = {}
+    open_zed_group: tuple[dict[str, object], dict[str, object]] | None = None
+    conflict_count = 0
+    for module, entries in module_lists:
+        for entry in entries:
+            if not isinstance(entry, dict):
+                merged_entries.append(entry)
+                open_zed_group = None
+                continue
+            entry_fields = cast(dict[str, object], entry)
+            if "key" in entry_fields:
+                binding = entry_fields
+                command = str(binding.get("command", ""))
+                binding_key = (
+                    str(binding["key"]),
+                    str(binding.get("when", "")),
+                    command if command.startswith("-") else "",
+                )
+                previous_binding = vscode_bindings.get(binding_key)
+                if previous_binding is not None:
+                    removed_indexes.add(previous_binding[2])
+                    if previous_binding[1] != binding:
+                        conflict_count += 1
+                        _log_message(
+                            f"Keybinding conflict: `{binding_key[0]}` (when `{binding_key[1]}`) from {module.name} "
+                            f"overrides {previous_binding[0].name}",
+                        )
+                ## the winner moves to its latest position, where VS Code gives it precedence
+                vscode_bindings[binding_key] = (module, binding, len(merged_entries))
+                merged_entries.append(binding)
+                open_zed_group = None
+            elif isinstance(entry_fields.get("bindings"), dict):
+                keymap_entry = entry_fields
+                context = str(keymap_entry.get("context", ""))
+                group_fields = {field: value for field, value in keymap_entry.items() if field != "bindings"}
+                if open_zed_group is None or open_zed_group[0] != group_fields:
+                    open_zed_group = (group_fields, {})
+                    merged_entries.append(
+                        {
+                            **group_fields,
+                            "bindings": open_zed_group[1],
+                        },
+                    )
+                group_bindings = open_zed_group[1]
+                for chord, action in cast(dict[str, object], keymap_entry["bindings"]).items():
+                    previous_action = zed_actions.get((context, chord))
+                    if previous_action is not None and previous_action[1] != action:
+                        conflict_count += 1
+                        _log_message(
+                            f"Keybinding conflict: `{chord}` (context `{context}`) from {module.name} "
+                            f"overrides {previous_action[0].name}",
+                        )
+                    zed_actions[(context, chord)] = (module, action)
+                    group_bindings[chord] = action
+            else:
+                merged_entries.append(entry_fields)
+                open_zed_group = None
+    if conflict_count:
+        _log_message(f"Resolved {conflict_count} keybinding conflict(s); later modules win.")
+    return [entry for index, entry in enumerate(merged_entries) if index not in removed_indexes]
+
 def install_extensions(
     *,
     command: str,
     extensions_file: Path,
     dry_run: bool,
-):
+    prune: bool = False,
+    vsix_cache_dir: Path = cache_extensions.VSIX_CACHE_DIR,
+) -> bool:
+    """
+  Install the listed extensions that are missing, in one CLI invocation; optionally uninstall unlisted ones.
+
+  The installed set is queried once with `--list-extensions`. If that query fails, every listed extension is
+  installed. Extension ids are compared case-insensitively, as the marketplace does. Lines may pin a version
+  as `publisher.name@version`. Extensions found in the local VSIX cache are installed from there instead of
+  the marketplace.
+  """
     if not extensions_file.exists():
         _log_message(f"No extensions file found at: {extensions_file}")
-        return
-    extensions = [e for e in extensions_file.read_text().splitlines() if e.strip()]
-    for ext in extensions:
-        apply_shell_actions.run_command(
-            args=[command, "--install-extension", ext],
+        return True
+    extensions = [e.strip() for e in extensions_file.read_text().splitlines() if e.strip()]
+    installed_extensions = get_installed_extensions(command=command)
+    listed_extension_ids = {cache_extensions.split_extension_spec(extension)[0] for extension in extensions}
+    missing_extensions = [
+        extension for extension in extensions if installed_extensions is None
+        or cache_extensions.split_extension_spec(extension)[0] not in installed_extensions
+    ]
+    is_successful = True
+    if missing_extensions:
+        install_sources: list[str] = []
+        for extension in missing_extensions:
+            cached_vsix = cache_extensions.get_cached_vsix(
+                extension_spec=extension,
+                cache_dir=vsix_cache_dir,
+            )
+            install_sources.append(extension if cached_vsix is None else str(cached_vsix))
+        cached_count = sum(source.endswith(".vsix") for source in install_sources)
+        if cached_count:
+            _log_message(f"Installing {cached_count} extension(s) from the VSIX cache: {vsix_cache_dir}")
+        is_successful = apply_shell_actions.run_command(
+            args=[command, *_repeat_flag(flag="--install-extension", values=install_sources)],
             script_name=SCRIPT_NAME,
-            description=f"install extension: {ext}",
+            description=f"install {len(missing_extensions)} extension(s): {', '.join(missing_extensions)}",
             dry_run=dry_run,
         )
+    else:
+        _log_message(
+            log_messages.format_dry_run(
+                message=f"All {len(extensions)} listed extension(s) are already installed.",
+                dry_run=dry_run,
+            ),
+        )
+    if prune and installed_extensions is not None:
+        unlisted_extensions = sorted(installed_extensions - listed_extension_ids)
+        if unlisted_extensions:
+            is_successful = apply_shell_actions.run_command(
+                args=[command, *_repeat_flag(flag="--uninstall-extension", values=unlisted_extensions)],
+                script_name=SCRIPT_NAME,
+                description=(
+                    f"uninstall {len(unlisted_extensions)} unlisted extension(s): {', '.join(unlisted_extensions)}"
+                ),
+                dry_run=dry_run,
+            ) and is_successful
+    return is_successful
 
 
-def shallow_clone_repo(
+def populate_vsix_cache(
     *,
-    repo: RepoConfig,
-    dry_run: bool,
-) -> None:
-    if repo.output.exists():
-        _log_message(f"{repo.name} already exists under: {repo.output}")
-        return
-    apply_shell_actions.run_command(
-        args=["git", "clone", "--depth", "1", repo.url,
-              str(repo.output)],
-        script_name=SCRIPT_NAME,
-        description=f"clone {repo.name} (shallow) under {repo.output}",
-        dry_run=dry_run,
+    extensions_file: Path,
+    vsix_cache_dir: Path,
+    vsix_files: list[Path],
+) -> bool:
+    """
+  Fill the VSIX cache on a connected machine, or from VSIX files copied over by hand.
+
+  With `vsix_files`, only those files are added. Otherwise every extension in `extensions_file` that is not
+  cached yet is downloaded from the marketplace. Return `True` iff nothing failed.
+  """
+    is_successful = True
+    if vsix_files:
+        for vsix_file in vsix_files:
+            try:
+                extension_id, version = cache_extensions.add_vsix(
+                    vsix_file,
+                    cache_dir=vsix_cache_dir,
+                )
+            except (OSError, ValueError) as error:
+                _log_message(f"Failed to cache {vsix_file}: {error}")
+                is_successful = False
+                continue
+            _log_message(f"Cached {extension_id}@{version} from: {vsix_file}")
+        return is_successful
+    extensions = [e.strip() for e in extensions_file.read_text().splitlines() if e.strip()]
+    for extension in extensions:
+        ## a pinned version never changes; an unpinned id is fetched again to pick up the latest release
+        if "@" in extension and cache_extensions.get_cached_vsix(
+                extension_spec=extension,
+                cache_dir=vsix_cache_dir,
+        ) is not None:
+            _log_message(f"Already cached: {extension}")
+            continue
+        try:
+            extension_id, version = cache_extensions.download_vsix(
+                extension_spec=extension,
+                cache_dir=vsix_cache_dir,
+            )
+        except (OSError, ValueError) as error:
+            _log_message(f"Failed to download {extension}: {error}")
+            is_successful = False
+            continue
+        _log_message(f"Cached {extension_id}@{version} from the marketplace")
+    return is_successful
+
+
+def get_installed_extensions(
+    *,
+    command: str,
+) -> set[str] | None:
+    """Return the lower-cased ids of installed extensions, or `None` if the editor CLI could not list them."""
+    try:
+        completed = subprocess.run(
+            args=[command, "--list-extensions"],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as error:
+        _log_message(f"Could not list installed extensions; installing all listed ones. ({error})")
+        return None
+    return {line.strip().lower() for line in completed.stdout.splitlines() if line.strip()}
+
+
+def _repeat_flag(
+    *,
+    flag: str,
+    values: list[str],
+) -> list[str]:
+    ## the `code` CLI accepts a flag once per extension, so one process handles the whole batch
+    return [arg for value in values for arg in (flag, value)]
+
+
+def get_lazy_plugin_repos(
+    *,
+    editor: EditorConfig,
+    plugins_dir: Path = LAZY_PLUGINS_DIR,
+    url_template: str = LAZY_PLUGIN_URL,
+) -> list[clone_repos.RepoConfig]:
+    """
+  Return every plugin pinned in `editor.lock_file`, cloned where lazy.nvim looks for it.
+
+  The lockfile only names plugins, so each repo is found from the spec strings in the editor's Lua files,
+  honouring a spec's `name = "..."`. Locked plugins that no spec mentions are logged and skipped, and so are
+  specs with a `build` step (e.g. `make` or `:TSUpdate`): lazy.nvim only runs it for plugins it installs itself.
+  """
+    if editor.lock_file is None or not editor.lock_file.exists():
+        return []
+    lock_entries = cast(dict[str, dict[str, str]], json.loads(editor.lock_file.read_text(encoding="utf-8")))
+    owner_repos: dict[str, str] = {}
+    built_plugin_names: set[str] = set()
+    for lua_file in sorted(editor.dotfiles_dir.rglob("*.lua")):
+        lua_source = lua_file.read_text(encoding="utf-8")
+        for spec_match in _LAZY_PLUGIN_SPEC_PATTERN.finditer(lua_source):
+            owner_repo = spec_match.group(1)
+            plugin_name = spec_match.group(2) or owner_repo.rsplit("/", 1)[-1]
+            if plugin_name not in owner_repos:
+                owner_repos[plugin_name] = owner_repo
+            if _LAZY_PLUGIN_BUILD_PATTERN.match(lua_source, spec_match.end()):
+                built_plugin_names.add(plugin_name)
+    repos: list[clone_repos.RepoConfig] = []
+    for plugin_name, lock_entry in sorted(lock_entries.items()):
+        owner_repo = owner_repos.get(plugin_name)
+        commit = lock_entry.get("commit")
+        if owner_repo is None or commit is None:
+            _log_message(f"Skipped `{plugin_name}` from {editor.lock_file.name}: no plugin spec names its repo.")
+            continue
+        if plugin_name in built_plugin_names:
+            _log_message(f"Left `{plugin_name}` for lazy.nvim to install, since its spec has a `build` step.")
+            continue
+        repos.append(
+            clone_repos.RepoConfig(
+                name=plugin_name,
+                url=url_template.format(owner_repo),
+                output=plugins_dir / plugin_name,
+                commit=commit,
+            ),
+        )
+    return repos
+
+
+def compute_doom_fingerprint(
+    *,
+    doom_config_dir: Path,
+    doom_dir: Path,
+) -> str | None:
+    """
+  Hash what `doom sync` depends on: every `*.el` in the Doom config, and the revision of the Doom checkout.
+
+  Return `None` when the revision cannot be read, so the sync is never skipped on a guess.
+  """
+    result = subprocess.run(
+        ["git", "-C", str(doom_dir), "rev-parse", "HEAD"],
+        capture_output=True,
+        text=True,
+        check=False,
     )
+    if result.returncode != 0:
+        return None
+    digest = hashlib.sha256(f"doom\0{result.stdout.strip()}\n".encode())
+    for el_file in sorted(doom_config_dir.glob("*.el")):
+        digest.update(f"{el_file.name}\0".encode())
+        digest.update(hashlib.sha256(el_file.read_bytes()).digest())
+    return digest.hexdigest()
 
 
 def run_doom_sync(
     *,
     dry_run: bool,
-) -> None:
-    doom_bin = CONFIG_DIR / "emacs" / "bin" / "doom"
+    force: bool = False,
+) -> bool:
+    """
+  Run `doom sync`, unless the Doom config and checkout are unchanged since the last successful sync.
+
+  `force` syncs regardless. The fingerprint is only saved after a sync succeeds, so a failed sync is retried.
+  """
+    doom_dir = CONFIG_DIR / "emacs"
+    doom_bin = doom_dir / "bin" / "doom"
     if not doom_bin.exists():
         _log_message(f"Doom binary not found at: {doom_bin}")
-        return
-    apply_shell_actions.run_command(
+        return False
+    fingerprint = compute_doom_fingerprint(
+        doom_config_dir=EDITORS["emacs"].dotfiles_dir,
+        doom_dir=doom_dir,
+    )
+    if (
+        not force and fingerprint is not None and fingerprint_runs.fingerprint_matches(
+            fingerprint,
+            fingerprint_file=DOOM_SYNC_FINGERPRINT_FILE,
+        )
+    ):
+        _log_message(
+            log_messages.format_dry_run(
+                message="Skipped doom sync: Doom config and checkout are unchanged since the last sync.",
+                dry_run=dry_run,
+            ),
+        )
+        return True
+    is_successful = apply_shell_actions.run_command(
         args=[str(doom_bin), "sync"],
         script_name=SCRIPT_NAME,
         description="doom sync",
         dry_run=dry_run,
         capture_output=False,
     )
+    if is_successful and not dry_run and fingerprint is not None:
+        fingerprint_runs.save_fingerprint(
+            fingerprint,
+            fingerprint_file=DOOM_SYNC_FINGERPRINT_FILE,
+        )
+    return is_successful
 
 
-def setup_editor(
+def plan_editor_actions(
     *,
+    editor_key: str,
     editor: EditorConfig,
     dry_run: bool,
-):
+    prune_extensions: bool = False,
+    vsix_cache_dir: Path = cache_extensions.VSIX_CACHE_DIR,
+    force_doom_sync: bool = False,
+) -> list[schedule_actions.Action]:
+    """
+  Return the setup steps for one editor as scheduler actions; editor detection runs now.
+
+  Doom sync waits for both the config link and the Doom checkout; extension installs depend on nothing.
+  """
     _log_message(
         log_messages.format_dry_run(
             message=f"Started setting up {editor.name}",
@@ -232,7 +686,7 @@ def setup_editor(
         sys.platform == "darwin" and editor.mac_app is not None
         and (Path("/Applications") / editor.mac_app).exists()
     )
-    if shutil.which(editor.command) or found_via_app:
+    if find_executables.find_executable(editor.command) or found_via_app:
         _log_message(
             log_messages.format_dry_run(
                 message=f"Found {editor.name} ({editor.command}) in your `$PATH`.",
@@ -250,38 +704,104 @@ def setup_editor(
                 dry_run=dry_run,
             ),
         )
-        return
+        return []
+    prefix = f"editors:{editor_key}"
+    actions: list[schedule_actions.Action] = []
     if editor.files is None:
-        apply_shell_actions.ensure_dir_exists(
-            directory=editor.target_dir.parent,
-            script_name=SCRIPT_NAME,
-            dry_run=dry_run,
+        actions.append(
+            schedule_actions.Action(
+                name=f"{prefix}:dir",
+                run=functools.partial(
+                    apply_shell_actions.ensure_dir_exists,
+                    directory=editor.target_dir.parent,
+                    script_name=SCRIPT_NAME,
+                    dry_run=dry_run,
+                ),
+            ),
         )
-        apply_shell_actions.create_symlink(
-            source_path=editor.dotfiles_dir,
-            target_path=editor.target_dir,
-            script_name=SCRIPT_NAME,
-            dry_run=dry_run,
+        actions.append(
+            schedule_actions.Action(
+                name=f"{prefix}:config",
+                run=functools.partial(
+                    apply_shell_actions.create_symlinks,
+                    links=[
+                        apply_shell_actions.LinkRequest(
+                            source_path=editor.dotfiles_dir,
+                            target_path=editor.target_dir,
+                        ),
+                    ],
+                    script_name=SCRIPT_NAME,
+                    dry_run=dry_run,
+                ),
+                depends_on=(f"{prefix}:dir", ),
+            ),
         )
     else:
-        setup_editor_files(
-            editor=editor,
-            dry_run=dry_run,
+        actions.append(
+            schedule_actions.Action(
+                name=f"{prefix}:config",
+                run=functools.partial(
+                    setup_editor_files,
+                    editor=editor,
+                    dry_run=dry_run,
+                ),
+            ),
         )
     if editor.clone_repo is not None:
-        shallow_clone_repo(
-            repo=editor.clone_repo,
-            dry_run=dry_run,
+        actions.append(
+            schedule_actions.Action(
+                name=f"{prefix}:clone",
+                run=functools.partial(
+                    clone_repos.clone_repo,
+                    repo=editor.clone_repo,
+                    script_name=SCRIPT_NAME,
+                    dry_run=dry_run,
+                ),
+            ),
+        )
+    ## one action per pinned plugin, so the scheduler fetches them concurrently before the first launch
+    for plugin_repo in get_lazy_plugin_repos(editor=editor):
+        actions.append(
+            schedule_actions.Action(
+                name=f"{prefix}:plugin:{plugin_repo.name}",
+                run=functools.partial(
+                    clone_repos.clone_repo,
+                    repo=plugin_repo,
+                    script_name=SCRIPT_NAME,
+                    dry_run=dry_run,
+                ),
+            ),
         )
     if editor.post_setup == PostSetup.DOOM_SYNC:
-        run_doom_sync(dry_run=dry_run)
+        ## `doom sync` writes straight to the terminal, so nothing else may write to it meanwhile
+        actions.append(
+            schedule_actions.Action(
+                name=f"{prefix}:doom-sync",
+                run=functools.partial(
+                    run_doom_sync,
+                    dry_run=dry_run,
+                    force=force_doom_sync,
+                ),
+                depends_on=tuple(action.name for action in actions),
+                exclusive=True,
+            ),
+        )
     ## install extensions if defined
     if editor.extensions is not None:
-        install_extensions(
-            command=editor.command,
-            extensions_file=editor.extensions,
-            dry_run=dry_run,
+        actions.append(
+            schedule_actions.Action(
+                name=f"{prefix}:extensions",
+                run=functools.partial(
+                    install_extensions,
+                    command=editor.command,
+                    extensions_file=editor.extensions,
+                    dry_run=dry_run,
+                    prune=prune_extensions,
+                    vsix_cache_dir=vsix_cache_dir,
+                ),
+            ),
         )
+    return actions
 
 
 def setup_editor_files(
@@ -291,35 +811,147 @@ def setup_editor_files(
 ) -> None:
     if editor.files is None:
         return
+    links: list[apply_shell_actions.LinkRequest] = []
     for file_name, mode in editor.files.items():
-        modules_dir = editor.dotfiles_dir / file_name
-        merged_config = merge_config_modules(
-            modules_dir=modules_dir,
+        output_path = write_merged_config(
+            editor=editor,
+            file_name=file_name,
             mode=mode,
-        )
-        if merged_config is None:
-            return
-        output_path = editor.dotfiles_dir / f"{file_name}.json"
-        target_path = editor.target_dir / f"{file_name}.json"
-        if dry_run:
-            _log_message(f"[dry-run] Would write merged settings to: {output_path}")
-        else:
-            with output_path.open("w", encoding="utf-8") as f:
-                json.dump(merged_config, f, indent=2)
-            _log_message(f"Wrote merged config to: {output_path}")
-        ## ensure target directory exists
-        apply_shell_actions.ensure_dir_exists(
-            directory=editor.target_dir,
-            script_name=SCRIPT_NAME,
             dry_run=dry_run,
         )
-        ## symlink merged config
-        apply_shell_actions.create_symlink(
-            source_path=output_path,
-            target_path=target_path,
-            script_name=SCRIPT_NAME,
-            dry_run=dry_run,
+        if output_path is None:
+            break
+        links.append(
+            apply_shell_actions.LinkRequest(
+                source_path=output_path,
+                target_path=editor.target_dir / f"{file_name}.json",
+            ),
         )
+    if not links:
+        return
+    ## ensure target directory exists
+    apply_shell_actions.ensure_dir_exists(
+        directory=editor.target_dir,
+        script_name=SCRIPT_NAME,
+        dry_run=dry_run,
+    )
+    ## symlink merged configs
+    apply_shell_actions.create_symlinks(
+        links=links,
+        script_name=SCRIPT_NAME,
+        dry_run=dry_run,
+    )
+
+
+def write_merged_config(
+    *,
+    editor: EditorConfig,
+    file_name: str,
+    mode: str,
+    dry_run: bool,
+) -> Path | None:
+    """Merge one module directory into its generated JSON file; return that file, or `None` if merging failed."""
+    merged_config = merge_config_modules(
+        modules_dir=editor.dotfiles_dir / file_name,
+        mode=mode,
+    )
+    if merged_config is None:
+        return None
+    output_path = editor.dotfiles_dir / f"{file_name}.json"
+    if dry_run:
+        _log_message(f"[dry-run] Would write merged settings to: {output_path}")
+    ## editors reload on every change event, so identical output must leave the file untouched
+    elif write_files.write_file_if_changed(
+            output_path,
+            content=json.dumps(merged_config, indent=2),
+    ):
+        _log_message(f"Wrote merged config to: {output_path}")
+    else:
+        _log_message(f"Merged config unchanged: {output_path}")
+    return output_path
+
+
+def watch_config_modules(
+    *,
+    editor_keys: tuple[str, ...],
+    dry_run: bool,
+    poll_seconds: float = WATCH_POLL_SECONDS,
+    debounce_seconds: float = WATCH_DEBOUNCE_SECONDS,
+) -> None:
+    """
+  Poll the module directories of the selected editors and re-merge each output once its modules settle.
+
+  Each poll costs one `os.scandir` per module directory. A burst of saves is collapsed into one merge that
+  starts `debounce_seconds` after the last change, and only the outputs whose modules changed are rebuilt.
+  Runs until interrupted.
+  """
+    selected_editor_configs = get_selected_editors(editor_keys=editor_keys)
+    watched_outputs = {
+        (editor_key, file_name): (editor, mode)
+        for editor_key, editor in selected_editor_configs.items() if editor.files is not None
+        for file_name, mode in editor.files.items()
+    }
+    if not watched_outputs:
+        _log_message("Nothing to watch; none of the selected editors use config modules.")
+        return
+    snapshots = {
+        output_key: _snapshot_modules(editor.dotfiles_dir / output_key[1])
+        for output_key, (editor, _) in watched_outputs.items()
+    }
+    pending_outputs: set[tuple[str, str]] = set()
+    last_change_time = 0.0
+    _log_message(f"Watching {len(watched_outputs)} module director(ies); press Ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(poll_seconds)
+            for output_key, (editor, _) in watched_outputs.items():
+                snapshot = _snapshot_modules(editor.dotfiles_dir / output_key[1])
+                if snapshot != snapshots[output_key]:
+                    snapshots[output_key] = snapshot
+                    pending_outputs.add(output_key)
+                    last_change_time = time.monotonic()
+            if not pending_outputs or time.monotonic() - last_change_time < debounce_seconds:
+                continue
+            for editor_key, file_name in sorted(pending_outputs):
+                editor, mode = watched_outputs[(editor_key, file_name)]
+                try:
+                    write_merged_config(
+                        editor=editor,
+                        file_name=file_name,
+                        mode=mode,
+                        dry_run=dry_run,
+                    )
+                except (OSError, ValueError) as error:
+                    ## a half-typed module is common while editing; keep watching and retry on the next save
+                    _log_message(f"Failed to merge {editor_key} {file_name}: {error}")
+            pending_outputs.clear()
+            log_messages.flush()
+    except KeyboardInterrupt:
+        _log_message("Stopped watching config modules.")
+
+
+def _snapshot_modules(
+    modules_dir: Path,
+) -> dict[str, tuple[int, int, int]]:
+    snapshot: dict[str, tuple[int, int, int]] = {}
+    try:
+        with os.scandir(modules_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".jsonc"):
+                    stat_result = entry.stat()
+                    snapshot[entry.name] = (stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return snapshot
+
+
+def get_editor_targets(
+    editor: EditorConfig,
+) -> list[Path]:
+    """Return the paths an editor config symlinks into the home directory."""
+    if editor.files is None:
+        return [editor.target_dir]
+    return [editor.target_dir / f"{file_name}.json" for file_name in editor.files]
 
 
 def get_selected_editors(
@@ -371,20 +1003,25 @@ def remove_symlinks(
         ),
     )
     selected_editor_configs = get_selected_editors(editor_keys=editor_keys)
-    for editor in selected_editor_configs.values():
-        if editor.files is None:
-            apply_shell_actions.remove_symlink(
-                target_path=editor.target_dir,
-                script_name=SCRIPT_NAME,
-                dry_run=dry_run,
-            )
-        else:
-            for file_name in editor.files:
-                apply_shell_actions.remove_symlink(
-                    target_path=editor.target_dir / f"{file_name}.json",
-                    script_name=SCRIPT_NAME,
-                    dry_run=dry_run,
-                )
+    target_paths = [
+        target_path for editor in selected_editor_configs.values()
+        for target_path in get_editor_targets(editor)
+    ]
+    ## also drop links recorded for editors that have since left `EDITORS`
+    target_paths.extend(
+        record_links.get_orphaned_targets(
+            layer=SCRIPT_NAME,
+            known_targets={
+                target_path
+                for editor in EDITORS.values() for target_path in get_editor_targets(editor)
+            },
+        ),
+    )
+    apply_shell_actions.remove_symlinks(
+        target_paths=target_paths,
+        script_name=SCRIPT_NAME,
+        dry_run=dry_run,
+    )
     _log_message(
         log_messages.format_dry_run(
             message="Finished removing editor config symlinks",
@@ -393,18 +1030,46 @@ def remove_symlinks(
     )
 
 
-def run(
+def plan_actions(
     *,
     dry_run: bool,
     editor_keys: tuple[str, ...] | None = None,
-):
-    log_messages.configure(write_to_file=not dry_run)
+    prune_extensions: bool = False,
+    vsix_cache_dir: Path = cache_extensions.VSIX_CACHE_DIR,
+    force_doom_sync: bool = False,
+) -> list[schedule_actions.Action]:
+    """Return the editors layer as scheduler actions."""
     selected_editor_configs = get_selected_editors(editor_keys=editor_keys)
-    for editor in selected_editor_configs.values():
-        setup_editor(
+    return [
+        action for editor_key, editor in selected_editor_configs.items() for action in plan_editor_actions(
+            editor_key=editor_key,
             editor=editor,
             dry_run=dry_run,
+            prune_extensions=prune_extensions,
+            vsix_cache_dir=vsix_cache_dir,
+            force_doom_sync=force_doom_sync,
         )
+    ]
+
+
+def run(
+    *,
+    dry_run: bool,
+    editor_keys: tuple[str, ...] | None = None,
+    prune_extensions: bool = False,
+    vsix_cache_dir: Path = cache_extensions.VSIX_CACHE_DIR,
+    force_doom_sync: bool = False,
+):
+    log_messages.configure(write_to_file=not dry_run)
+    schedule_actions.run_actions(
+        actions=plan_actions(
+            dry_run=dry_run,
+            editor_keys=editor_keys,
+            prune_extensions=prune_extensions,
+            vsix_cache_dir=vsix_cache_dir,
+            force_doom_sync=force_doom_sync,
+        ),
+    )
     _log_message(
         log_messages.format_dry_run(
             message="Finished setting up editors.",
@@ -435,12 +1100,59 @@ def main():
         action="store_true",
         help="Apply all subscribed editors from `this-system.toml`",
     )
+    parser.add_argument(
+        "--prune-extensions",
+        action="store_true",
+        help="Uninstall extensions that are no longer listed in the editor's extensions file",
+    )
+    parser.add_argument(
+        "--vsix-cache",
+        type=Path,
+        default=cache_extensions.VSIX_CACHE_DIR,
+        metavar="DIR",
+        help="Install extensions from (and populate) the VSIX cache in DIR",
+    )
+    parser.add_argument(
+        "--populate-vsix-cache",
+        action="store_true",
+        help="Download every listed extension into the VSIX cache and exit; needs network access",
+    )
+    parser.add_argument(
+        "--add-vsix",
+        nargs="+",
+        type=Path,
+        default=[],
+        metavar="FILE",
+        help="Add local VSIX files to the VSIX cache and exit",
+    )
+    parser.add_argument(
+        "--force-doom-sync",
+        action="store_true",
+        help="Run `doom sync` even when the Doom config and checkout are unchanged since the last sync",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="After applying, keep re-merging generated configs whenever their modules change",
+    )
     args = parser.parse_args()
     include_all = cast(bool, args.all)
     requested_editor_keys = tuple(cast(list[str], args.which))
     dry_run = cast(bool, args.dry_run)
     if include_all and requested_editor_keys:
         parser.error("`--all` cannot be combined with `--which`")
+    vsix_cache_dir = cast(Path, args.vsix_cache).expanduser()
+    vsix_files = cast(list[Path], args.add_vsix)
+    if cast(bool, args.populate_vsix_cache) or vsix_files:
+        extensions_file = EDITORS["vscode"].extensions
+        assert extensions_file is not None
+        if not populate_vsix_cache(
+                extensions_file=extensions_file,
+                vsix_cache_dir=vsix_cache_dir,
+                vsix_files=vsix_files,
+        ):
+            raise SystemExit(1)
+        return
     if not include_all and not requested_editor_keys:
         parser.error("pass `--all` or at least one `--which`")
     profile = load_profiles.load_profile(required=True)
@@ -454,7 +1166,15 @@ def main():
     run(
         dry_run=dry_run,
         editor_keys=editor_keys,
+        prune_extensions=cast(bool, args.prune_extensions),
+        vsix_cache_dir=vsix_cache_dir,
+        force_doom_sync=cast(bool, args.force_doom_sync),
     )
+    if cast(bool, args.watch):
+        watch_config_modules(
+            editor_keys=editor_keys,
+            dry_run=dry_run,
+        )
 
 
 ##
@@ -7,11 +7,12 @@
 ## stdlib
 import argparse
 from dataclasses import dataclass
+import functools
 from pathlib import Path
 from typing import cast
 ## local
 from utils import load_profiles
-from utils import log_messages, apply_shell_actions
+from utils import log_messages, apply_shell_actions, record_links, schedule_actions
 
 ##
 ## === EXTRA CONFIG
@@ -125,14 +126,39 @@ def setup_extra(
         script_name=SCRIPT_NAME,
         dry_run=dry_run,
     )
-    apply_shell_actions.create_symlink(
-        source_path=extra.source_path,
-        target_path=extra.target_path,
+    apply_shell_actions.create_symlinks(
+        links=[
+            apply_shell_actions.LinkRequest(
+                source_path=extra.source_path,
+                target_path=extra.target_path,
+            ),
+        ],
         script_name=SCRIPT_NAME,
         dry_run=dry_run,
     )
 
 
+def plan_actions(
+    *,
+    dry_run: bool,
+    extra_keys: tuple[str, ...] | None = None,
+    platform_tags: tuple[str, ...] | None = None,
+) -> list[schedule_actions.Action]:
+    """Return one independent scheduler action per selected extra."""
+    selected_extra_configs = get_selected_extras(extra_keys=extra_keys)
+    return [
+        schedule_actions.Action(
+            name=f"extras:{extra_key}",
+            run=functools.partial(
+                setup_extra,
+                extra=extra,
+                dry_run=dry_run,
+                platform_tags=platform_tags,
+            ),
+        ) for extra_key, extra in selected_extra_configs.items()
+    ]
+
+
 def get_selected_extras(
     *,
     extra_keys: tuple[str, ...] | None,
@@ -182,12 +208,19 @@ def remove_symlinks(
         ),
     )
     selected_extra_configs = get_selected_extras(extra_keys=extra_keys)
-    for extra in selected_extra_configs.values():
-        apply_shell_actions.remove_symlink(
-            target_path=extra.target_path,
-            script_name=SCRIPT_NAME,
-            dry_run=dry_run,
-        )
+    target_paths = [extra.target_path for extra in selected_extra_configs.values()]
+    ## also drop links recorded for extras that have since left `EXTRAS`
+    target_paths.extend(
+        record_links.get_orphaned_targets(
+            layer=SCRIPT_NAME,
+            known_targets={extra.target_path for extra in EXTRAS.values()},
+        ),
+    )
+    apply_shell_actions.remove_symlinks(
+        target_paths=target_paths,
+        script_name=SCRIPT_NAME,
+        dry_run=dry_run,
+    )
     _log_message(
         log_messages.format_dry_run(
             message="Finished removing extra config symlinks",
@@ -209,13 +242,13 @@ def run(
             dry_run=dry_run,
         ),
     )
-    selected_extra_configs = get_selected_extras(extra_keys=extra_keys)
-    for extra in selected_extra_configs.values():
-        setup_extra(
-            extra=extra,
+    schedule_actions.run_actions(
+        actions=plan_actions(
             dry_run=dry_run,
+            extra_keys=extra_keys,
             platform_tags=platform_tags,
-        )
+        ),
+    )
     _log_message(
         log_messages.format_dry_run(
             message="Finished setting up extra configs",
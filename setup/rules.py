@@ -6,11 +6,12 @@
 
 ## stdlib
 import argparse
+import functools
 from pathlib import Path
 from typing import cast
 
 ## local
-from utils import apply_shell_actions, log_messages
+from utils import apply_shell_actions, log_messages, record_links, schedule_actions
 
 ##
 ## === CONFIG
@@ -33,20 +34,40 @@ def link_all_rules(
     dry_run: bool,
 ) -> None:
     """Symlink all rule files from the dotfiles into ~/.rules/, preserving substructure."""
-    for source_path in sorted(RULES_DIR.rglob("*.md")):
-        relative_path = source_path.relative_to(RULES_DIR)
-        target_path = TARGET_DIR / relative_path
-        apply_shell_actions.ensure_dir_exists(
-            directory=target_path.parent,
-            script_name=SCRIPT_NAME,
-            dry_run=dry_run,
-        )
-        apply_shell_actions.create_symlink(
+    links = [
+        apply_shell_actions.LinkRequest(
             source_path=source_path,
-            target_path=target_path,
+            target_path=TARGET_DIR / source_path.relative_to(RULES_DIR),
+        ) for source_path in sorted(RULES_DIR.rglob("*.md"))
+    ]
+    ## one check per distinct parent, not one per rule file
+    for directory in sorted({link.target_path.parent for link in links}):
+        apply_shell_actions.ensure_dir_exists(
+            directory=directory,
             script_name=SCRIPT_NAME,
             dry_run=dry_run,
         )
+    apply_shell_actions.create_symlinks(
+        links=links,
+        script_name=SCRIPT_NAME,
+        dry_run=dry_run,
+    )
+
+
+def plan_actions(
+    *,
+    dry_run: bool,
+) -> list[schedule_actions.Action]:
+    """Return the rules layer as a single scheduler action."""
+    return [
+        schedule_actions.Action(
+            name="rules:links",
+            run=functools.partial(
+                link_all_rules,
+                dry_run=dry_run,
+            ),
+        ),
+    ]
 
 
 ##
@@ -65,12 +86,16 @@ def remove_symlinks(
             dry_run=dry_run,
         ),
     )
-    for target_path in sorted(TARGET_DIR.rglob("*.md")):
-        apply_shell_actions.remove_symlink(
-            target_path=target_path,
-            script_name=SCRIPT_NAME,
-            dry_run=dry_run,
-        )
+    if record_links.manifest_exists():
+        target_paths = [record.target_path for record in record_links.get_layer_records(layer=SCRIPT_NAME)]
+    else:
+        ## links made before the manifest existed can only be found by walking the tree
+        target_paths = sorted(TARGET_DIR.rglob("*.md"))
+    apply_shell_actions.remove_symlinks(
+        target_paths=target_paths,
+        script_name=SCRIPT_NAME,
+        dry_run=dry_run,
+    )
     _log_message(
         log_messages.format_dry_run(
             message="Finished removing rule symlinks",
@@ -90,7 +115,7 @@ def run(
             dry_run=dry_run,
         ),
     )
-    link_all_rules(dry_run=dry_run)
+    schedule_actions.run_actions(actions=plan_actions(dry_run=dry_run))
     _log_message(
         log_messages.format_dry_run(
             message="Finished linking rules",
@@ -7,14 +7,16 @@
 ## stdlib
 import argparse
 from dataclasses import dataclass
+import functools
+import hashlib
 import os
 from pathlib import Path
-import shutil
+import sys
 from typing import cast
 
 ## local
 from utils import load_profiles
-from utils import log_messages, apply_shell_actions
+from utils import find_executables, log_messages, apply_shell_actions, record_links, schedule_actions, write_files
 
 ##
 ## === SHELL CONFIG
@@ -30,23 +32,55 @@ _log_message = log_messages.make_logger(SCRIPT_NAME)
 
 @dataclass
 class ShellConfig:
+    """
+  One supported shell and the home dotfiles it uses.
+
+  Fields
+  ---
+  - `files`:
+      Linked from `shell/<name>/` into the home as `.<file>`.
+
+  - `sourced_files`:
+      Home dotfiles the rc file sources, in the same order; also what a shell bundle inlines.
+  """
+
     name: str
     files: list[str]
+    sourced_files: list[str]
 
 
 UTILS_FILES = ["shell_aliases", "shell_functions", "shell_options", "shell_paths"]
+## `.project_aliases` is linked by the extras layer. `.shell_local` is left to each machine, so it is never bundled,
+## since no setup run would see it change; the rc files source it after the bundle and then `.shell_hpc`, which
+## stays unbundled so it keeps overriding `.shell_local` as it always has
+SOURCED_SHARED_FILES = UTILS_FILES + ["project_aliases"]
 
 SHELLS = [
     ShellConfig(
         name="bash",
         files=["bash_profile", "bashrc", "bash_options", "bash_prompt", "inputrc"],
+        sourced_files=["shell_capabilities", "bash_options", "bash_prompt"] + SOURCED_SHARED_FILES,
     ),
     ShellConfig(
         name="zsh",
         files=["zshrc", "zsh_options", "zsh_prompt"],
+        sourced_files=["shell_capabilities", "zsh_options", "zsh_prompt"] + SOURCED_SHARED_FILES,
     ),
 ]
 
+_BUNDLE_HASH_PREFIX = "## inputs sha256: "
+
+CAPABILITIES_FILE = HOME_DIR / ".shell_capabilities"
+## every command the sourced files test with `has_command`
+CAPABILITY_COMMANDS = ["bat", "code", "fzf", "keychain", "nvim"]
+## directories `.shell_paths` prepends to `$PATH`, which the setup process itself may not have
+_SHELL_PATH_DIRS = [HOME_DIR / ".local" / "bin"]
+_MACOS_SHELL_PATH_DIRS = [
+    Path("/opt/homebrew/bin"),
+    Path("/Library/TeX/texbin"),
+    Path("/Applications/VSCode.app/Contents/Resources/app/bin"),
+]
+
 ##
 ## === SHELL HELPERS
 ##
@@ -71,7 +105,7 @@ def change_login_shell(
     dry_run: bool = False,
 ):
     ## resolve full path to `shell` binary
-    shell_path = shutil.which(shell)
+    shell_path = find_executables.find_executable(shell)
     if not shell_path:
         ## `shell` not found
         _log_message(
@@ -101,6 +135,156 @@ def change_login_shell(
         )
 
 
+def resolve_capabilities(
+    *,
+    platform_tags: tuple[str, ...],
+) -> tuple[list[str], list[str]]:
+    """
+  Return the `(platforms, commands)` the sourced files test for with `has_platform` and `has_command`.
+
+  Platforms are the profile's `platforms` tags; a profile naming neither `linux` nor `macos` gets the tag of the
+  running system added. Commands are looked up in `$PATH` plus the directories `.shell_paths` prepends to it.
+  """
+    platforms = list(platform_tags)
+    if "linux" not in platforms and "macos" not in platforms:
+        platforms.insert(0, "macos" if sys.platform == "darwin" else "linux")
+    search_dirs = _SHELL_PATH_DIRS + (_MACOS_SHELL_PATH_DIRS if "macos" in platforms else [])
+    commands = [
+        command for command in CAPABILITY_COMMANDS
+        if find_executables.find_executable(command)
+        or any(os.access(search_dir / command, os.X_OK) for search_dir in search_dirs)
+    ]
+    return platforms, commands
+
+
+def write_capabilities(
+    *,
+    platform_tags: tuple[str, ...],
+    dry_run: bool,
+) -> None:
+    """Write `~/.shell_capabilities`, so shell startup reads what setup resolved instead of probing for it."""
+    platforms, commands = resolve_capabilities(platform_tags=platform_tags)
+    if dry_run:
+        _log_message(
+            f"[dry-run] Would write capabilities to: {CAPABILITIES_FILE} "
+            f"(platforms: {' '.join(platforms)}; commands: {' '.join(commands) or 'none'})",
+        )
+        return
+    ## padded with spaces, so `has_platform` and `has_command` match whole words with one pattern test
+    capabilities_content = (
+        "## generated by `setup/shell.py`; refresh with `uv run -m setup.shell --refresh-capabilities`\n"
+        f'DOTFILES_PLATFORMS=" {" ".join(platforms)} "\n'
+        f'DOTFILES_COMMANDS=" {" ".join(commands)} "\n'
+    )
+    if write_files.write_file_if_changed(
+            CAPABILITIES_FILE,
+            content=capabilities_content,
+    ):
+        _log_message(f"Wrote capabilities to: {CAPABILITIES_FILE}")
+    else:
+        _log_message(f"Capabilities unchanged: {CAPABILITIES_FILE}")
+
+
+def get_bundle_path(
+    shell: str,
+) -> Path:
+    return HOME_DIR / f".{shell}_bundle"
+
+
+def write_shell_bundle(
+    *,
+    shell: str,
+    dry_run: bool,
+) -> bool:
+    """
+  Inline the files the `shell` rc sources into `~/.<shell>_bundle`, which the rc then sources instead.
+
+  The bundle is rewritten only when the inputs hash recorded in its header changes. For zsh it is also compiled
+  with `zcompile`, and `source` picks up the `.zwc` while it is newer than the bundle. Return `False` on failure.
+  """
+    chosen = next(s for s in SHELLS if s.name == shell)
+    bundle_path = get_bundle_path(shell)
+    input_paths = [HOME_DIR / f".{file_name}" for file_name in chosen.sourced_files]
+    input_contents = {input_path: _read_bundle_input(input_path) for input_path in input_paths}
+    inputs_digest = hashlib.sha256()
+    for input_path, input_content in input_contents.items():
+        inputs_digest.update(input_path.name.encode() + b"\0")
+        ## a missing input hashes differently from an empty one, so linking it later rebuilds the bundle
+        inputs_digest.update(b"\1" if input_content is None else input_content.encode() + b"\0")
+    inputs_hash = inputs_digest.hexdigest()
+    is_bundle_current = _read_bundle_hash(bundle_path) == inputs_hash
+    zsh_path = find_executables.find_executable("zsh") if shell == "zsh" else None
+    zwc_path = bundle_path.with_name(f"{bundle_path.name}.zwc")
+    if is_bundle_current and (zsh_path is None or zwc_path.exists()):
+        _log_message(f"Shell bundle up to date: {bundle_path}")
+        return True
+    if dry_run:
+        _log_message(f"[dry-run] Would write shell bundle to: {bundle_path}")
+        return True
+    if not is_bundle_current:
+        sections = [
+            f"## generated by `setup/shell.py` from the files `.{shell}rc` sources; edit those, not this file\n"
+            f"{_BUNDLE_HASH_PREFIX}{inputs_hash}\n",
+        ]
+        sections.extend(
+            f"## --- ~/{input_path.name}\n\n{input_content.rstrip()}\n"
+            for input_path, input_content in input_contents.items() if input_content is not None
+        )
+        write_files.write_file_atomically(
+            bundle_path,
+            content="\n".join(sections),
+        )
+        _log_message(f"Wrote shell bundle to: {bundle_path}")
+    if zsh_path is None:
+        return True
+    return apply_shell_actions.run_command(
+        args=[zsh_path, "-fc", 'zcompile "$1"', "zcompile", str(bundle_path)],
+        script_name=SCRIPT_NAME,
+        description=f"zcompile {bundle_path}",
+    )
+
+
+def remove_shell_bundles(
+    *,
+    shells: list[str],
+    dry_run: bool,
+) -> None:
+    """Remove the bundles of `shells`, so their rc files fall back to sourcing each file."""
+    for shell in shells:
+        bundle_path = get_bundle_path(shell)
+        for generated_path in (bundle_path, bundle_path.with_name(f"{bundle_path.name}.zwc")):
+            if not generated_path.exists():
+                continue
+            if dry_run:
+                _log_message(f"[dry-run] Would remove shell bundle: {generated_path}")
+                continue
+            generated_path.unlink()
+            _log_message(f"Removed shell bundle: {generated_path}")
+
+
+def _read_bundle_input(
+    input_path: Path,
+) -> str | None:
+    try:
+        return input_path.read_text()
+    except OSError:
+        return None
+
+
+def _read_bundle_hash(
+    bundle_path: Path,
+) -> str | None:
+    try:
+        with open(bundle_path) as bundle_file:
+            header_lines = [bundle_file.readline(), bundle_file.readline()]
+    except OSError:
+        return None
+    for header_line in header_lines:
+        if header_line.startswith(_BUNDLE_HASH_PREFIX):
+            return header_line[len(_BUNDLE_HASH_PREFIX):].strip()
+    return None
+
+
 ##
 ## === PROGRAM MAIN
 ##
@@ -118,12 +302,28 @@ def remove_symlinks(
         ),
     )
     all_files = UTILS_FILES + [f for s in SHELLS for f in s.files]
-    for file_name in all_files:
-        apply_shell_actions.remove_symlink(
-            target_path=HOME_DIR / f".{file_name}",
-            script_name=SCRIPT_NAME,
-            dry_run=dry_run,
-        )
+    target_paths = [HOME_DIR / f".{file_name}" for file_name in all_files]
+    target_paths.extend(
+        record_links.get_orphaned_targets(
+            layer=SCRIPT_NAME,
+            known_targets=set(target_paths),
+        ),
+    )
+    apply_shell_actions.remove_symlinks(
+        target_paths=target_paths,
+        script_name=SCRIPT_NAME,
+        dry_run=dry_run,
+    )
+    remove_shell_bundles(
+        shells=[s.name for s in SHELLS],
+        dry_run=dry_run,
+    )
+    if CAPABILITIES_FILE.exists():
+        if dry_run:
+            _log_message(f"[dry-run] Would remove capabilities: {CAPABILITIES_FILE}")
+        else:
+            CAPABILITIES_FILE.unlink()
+            _log_message(f"Removed capabilities: {CAPABILITIES_FILE}")
     _log_message(
         log_messages.format_dry_run(
             message="Finished removing shell config symlinks",
@@ -132,54 +332,144 @@ def remove_symlinks(
     )
 
 
+def link_shell_files(
+    *,
+    shell: str,
+    dry_run: bool,
+) -> None:
+    """Link the shared and selected shell config files; back up config files of the other shells."""
+    chosen = next(s for s in SHELLS if s.name == shell)
+    others = [s for s in SHELLS if s.name != shell]
+    ## link shared config files, then config files for the selected shell env
+    links = [
+        apply_shell_actions.LinkRequest(
+            source_path=SHELL_DIR / "utils" / file_name,
+            target_path=HOME_DIR / f".{file_name}",
+        ) for file_name in UTILS_FILES
+    ]
+    links.extend(
+        apply_shell_actions.LinkRequest(
+            source_path=SHELL_DIR / chosen.name / file_name,
+            target_path=HOME_DIR / f".{file_name}",
+        ) for file_name in chosen.files
+    )
+    apply_shell_actions.create_symlinks(
+        links=links,
+        script_name=SCRIPT_NAME,
+        dry_run=dry_run,
+    )
+    ## remove config files for other shell envs
+    other_target_paths = [HOME_DIR / f".{file_name}" for s in others for file_name in s.files]
+    for target_path in other_target_paths:
+        remove_file_if_exists(
+            target_path=target_path,
+            dry_run=dry_run,
+        )
+    if not dry_run:
+        record_links.update_manifest(removed=other_target_paths)
+    remove_shell_bundles(
+        shells=[s.name for s in others],
+        dry_run=dry_run,
+    )
+
+
+def plan_actions(
+    *,
+    shell: str,
+    dry_run: bool,
+    set_login_shell: bool = True,
+    bundle: bool = False,
+    bundle_after: tuple[str, ...] = (),
+    platform_tags: tuple[str, ...] = (),
+) -> list[schedule_actions.Action]:
+    """
+  Return the shell layer as scheduler actions.
+
+  With `bundle`, the bundle is written once the links and the `bundle_after` actions (e.g. the extras that link
+  sourced files) are done; without it, stale bundles are removed so the rc files source each file again.
+  """
+    actions = [
+        schedule_actions.Action(
+            name="shell:links",
+            run=functools.partial(
+                link_shell_files,
+                shell=shell,
+                dry_run=dry_run,
+            ),
+        ),
+        schedule_actions.Action(
+            name="shell:capabilities",
+            run=functools.partial(
+                write_capabilities,
+                platform_tags=platform_tags,
+                dry_run=dry_run,
+            ),
+        ),
+    ]
+    if bundle:
+        actions.append(
+            schedule_actions.Action(
+                name="shell:bundle",
+                run=functools.partial(
+                    write_shell_bundle,
+                    shell=shell,
+                    dry_run=dry_run,
+                ),
+                depends_on=("shell:links", "shell:capabilities") + bundle_after,
+            ),
+        )
+    else:
+        actions.append(
+            schedule_actions.Action(
+                name="shell:bundle",
+                run=functools.partial(
+                    remove_shell_bundles,
+                    shells=[s.name for s in SHELLS],
+                    dry_run=dry_run,
+                ),
+            ),
+        )
+    if set_login_shell:
+        ## `chsh` prompts for a password, so nothing else may write to the terminal meanwhile
+        actions.append(
+            schedule_actions.Action(
+                name="shell:login-shell",
+                run=functools.partial(
+                    change_login_shell,
+                    shell=shell,
+                    dry_run=dry_run,
+                ),
+                depends_on=("shell:links", ),
+                exclusive=True,
+            ),
+        )
+    return actions
+
+
 def run(
     *,
     shell: str,
     dry_run: bool,
     set_login_shell: bool = True,
+    bundle: bool = False,
+    platform_tags: tuple[str, ...] = (),
 ):
     log_messages.configure(write_to_file=not dry_run)
-    chosen = next(s for s in SHELLS if s.name == shell)
-    others = [s for s in SHELLS if s.name != shell]
     _log_message(
         log_messages.format_dry_run(
             message="Started running!",
             dry_run=dry_run,
         ),
     )
-    ## link shared config files
-    for file_name in UTILS_FILES:
-        source_path = SHELL_DIR / "utils" / file_name
-        target_path = HOME_DIR / f".{file_name}"
-        apply_shell_actions.create_symlink(
-            source_path=source_path,
-            target_path=target_path,
-            script_name=SCRIPT_NAME,
-            dry_run=dry_run,
-        )
-    ## link config files for the selected shell env
-    for file_name in chosen.files:
-        source_path = SHELL_DIR / chosen.name / file_name
-        target_path = HOME_DIR / f".{file_name}"
-        apply_shell_actions.create_symlink(
-            source_path=source_path,
-            target_path=target_path,
-            script_name=SCRIPT_NAME,
+    schedule_actions.run_actions(
+        actions=plan_actions(
+            shell=shell,
             dry_run=dry_run,
-        )
-    ## remove config files for other shell envs
-    for s in others:
-        for file_name in s.files:
-            remove_file_if_exists(
-                target_path=HOME_DIR / f".{file_name}",
-                dry_run=dry_run,
-            )
-    if set_login_shell:
-        ## update default login shell env
-        change_login_shell(
-            shell=chosen.name,
-            dry_run=dry_run,
-        )
+            set_login_shell=set_login_shell,
+            bundle=bundle,
+            platform_tags=platform_tags,
+        ),
+    )
     _log_message(
         log_messages.format_dry_run(
             message="Finished!",
@@ -188,6 +478,26 @@ def run(
     )
 
 
+def refresh_capabilities(
+    *,
+    shell: str,
+    dry_run: bool,
+    platform_tags: tuple[str, ...],
+    bundle: bool,
+):
+    """Re-resolve `~/.shell_capabilities`, e.g. after installing a tool, and rebuild the bundle that inlines it."""
+    log_messages.configure(write_to_file=not dry_run)
+    write_capabilities(
+        platform_tags=platform_tags,
+        dry_run=dry_run,
+    )
+    if bundle:
+        write_shell_bundle(
+            shell=shell,
+            dry_run=dry_run,
+        )
+
+
 def main():
     ## parse user inputs
     parser = argparse.ArgumentParser(
@@ -198,6 +508,11 @@ def main():
         action="store_true",
         help="Print actions without applying them",
     )
+    parser.add_argument(
+        "--refresh-capabilities",
+        action="store_true",
+        help="Only re-resolve the platforms and commands in `~/.shell_capabilities`, e.g. after installing a tool",
+    )
     args = parser.parse_args()
     dry_run = cast(bool, args.dry_run)
     profile = load_profiles.load_profile(required=True)
@@ -208,10 +523,20 @@ def main():
             "`shell` is missing from `this-system.toml`; "
             'add `shell = "zsh"` or `shell = "bash"`.',
         )
+    if cast(bool, args.refresh_capabilities):
+        refresh_capabilities(
+            shell=profile.shell,
+            dry_run=dry_run,
+            platform_tags=profile.platforms,
+            bundle=profile.bundle_shell,
+        )
+        return
     run(
         shell=profile.shell,
         dry_run=dry_run,
         set_login_shell=profile.set_login_shell,
+        bundle=profile.bundle_shell,
+        platform_tags=profile.platforms,
     )
 
 
@@ -7,14 +7,18 @@
 ## stdlib
 import argparse
 from dataclasses import dataclass
+import functools
+import hashlib
+import os
 from pathlib import Path
-import shutil
+import re
 import sys
 from typing import cast
 
 ## local
 from utils import load_profiles
-from utils import log_messages, apply_shell_actions
+from utils import clone_repos, find_executables, log_messages, apply_shell_actions, record_links, schedule_actions
+from utils import write_files
 
 ##
 ## === TOOL CONFIG
@@ -28,12 +32,14 @@ CONFIG_DIR = HOME_DIR / ".config"
 
 _log_message = log_messages.make_logger(SCRIPT_NAME)
 
-
-@dataclass
-class RepoConfig:
-    name: str
-    url: str
-    output: Path
+_TPM_PLUGIN_PATTERN = re.compile(r"""^\s*set(?:-option)?\s+-g\s+@plugin\s+['"]([^'"]+)['"]""", re.MULTILINE)
+## `{}` is the `owner/repo` of a plugin; point it at local bare repos to test without the network
+TPM_PLUGIN_URL = os.environ.get("DOTFILES_TPM_PLUGIN_URL") or "https://github.com/{}"
+## bump when the compiled layout changes, so existing compiled configs are regenerated
+COMPILED_CONFIG_VERSION = 2
+## set by the compiled config, so the tracked `tmux.conf` that sources it skips its own modules
+COMPILED_CONFIG_OPTION = "@dotfiles_compiled"
+_COMPILED_HASH_PREFIX = "## modules sha256: "
 
 
 @dataclass
@@ -43,7 +49,10 @@ class ToolConfig:
     dotfiles_dir: Path
     target_dir: Path
     mac_app: str | None = None
-    clone_repo: RepoConfig | None = None
+    clone_repo: clone_repos.RepoConfig | None = None
+    plugins_file: Path | None = None
+    config_modules_dir: Path | None = None
+    compiled_config: Path | None = None
 
 
 TOOLS: dict[str, ToolConfig] = {
@@ -53,11 +62,15 @@ TOOLS: dict[str, ToolConfig] = {
         brew="tmux",
         dotfiles_dir=DOTFILES_DIR / "tmux",
         target_dir=CONFIG_DIR / "tmux",
-        clone_repo=RepoConfig(
+        clone_repo=clone_repos.RepoConfig(
             name="TPM",
             url="https://github.com/tmux-plugins/tpm",
             output=CONFIG_DIR / "tmux" / "plugins" / "tpm",
         ),
+        plugins_file=DOTFILES_DIR / "tmux" / "conf" / "04-plugins.conf",
+        config_modules_dir=DOTFILES_DIR / "tmux" / "conf",
+        ## generated per home, outside the repo, so fleet homes never write the same tracked file
+        compiled_config=record_links.STATE_DIR / "tmux.conf",
     ),
     "kitty":
     ToolConfig(
@@ -139,7 +152,7 @@ def check_installed_tools(
             sys.platform == "darwin" and tool.mac_app is not None
             and (Path("/Applications") / tool.mac_app).exists()
         )
-        if shutil.which(command) or found_via_app:
+        if find_executables.find_executable(command) or found_via_app:
             _log_message(
                 log_messages.format_dry_run(
                     message=f"Found {tool.name} ({command}) in your `$PATH`.",
@@ -161,24 +174,258 @@ def check_installed_tools(
     return installed_tool_keys
 
 
-def shallow_clone_repo(
+def get_plugin_repos(
     *,
-    repo: RepoConfig,
-    dry_run: bool,
-):
-    if repo.output.exists():
-        _log_message(
-            log_messages.format_dry_run(
-                message=f"{repo.name} already exists under: {repo.output}",
-                dry_run=dry_run,
+    tool: ToolConfig,
+    url_template: str = TPM_PLUGIN_URL,
+) -> list[clone_repos.RepoConfig]:
+    """
+  Return the TPM plugins listed in `tool.plugins_file`, each cloned beside TPM under the name TPM would use.
+
+  `owner/repo` entries expand through `url_template`; full URLs and paths are used as-is. TPM itself is the
+  tool's `clone_repo`, and branch-pinned entries (`owner/repo#branch`) are left for TPM to install.
+  """
+    if tool.plugins_file is None or tool.clone_repo is None or not tool.plugins_file.exists():
+        return []
+    plugins_dir = tool.clone_repo.output.parent
+    repos: list[clone_repos.RepoConfig] = []
+    for plugin_match in _TPM_PLUGIN_PATTERN.finditer(tool.plugins_file.read_text()):
+        plugin_spec = plugin_match.group(1)
+        if "#" in plugin_spec:
+            continue
+        is_full_url = "://" in plugin_spec or plugin_spec.startswith(("git@", "/"))
+        plugin_dir = plugins_dir / _get_plugin_name(plugin_spec)
+        if plugin_dir == tool.clone_repo.output:
+            continue
+        repos.append(
+            clone_repos.RepoConfig(
+                name=plugin_spec,
+                url=plugin_spec if is_full_url else url_template.format(plugin_spec),
+                output=plugin_dir,
             ),
         )
+    return repos
+
+
+def hash_config_modules(
+    module_paths: list[Path],
+) -> str:
+    """Return one sha256 over the names and contents of `module_paths`, in order."""
+    modules_digest = hashlib.sha256(f"v{COMPILED_CONFIG_VERSION}\0".encode())
+    for module_path in module_paths:
+        modules_digest.update(module_path.name.encode() + b"\0")
+        modules_digest.update(module_path.read_bytes() + b"\0")
+    return modules_digest.hexdigest()
+
+
+def render_compiled_config(
+    *,
+    tool: ToolConfig,
+    module_paths: list[Path],
+    modules_hash: str,
+) -> str:
+    """
+  Return `module_paths` inlined into one config, with TPM's start-up work written out right after `plugins_file`.
+
+  TPM's `run` forks a shell that lists the `@plugin` options and runs each plugin's `*.tmux` files. Here the plugin
+  directories are read from `plugins_file` now, so a tmux start costs one `run-shell` and no `source-file` opens.
+  Paths are written relative to `$HOME`, so the output is the same for every home that links it.
+  """
+    sections = [
+        "## generated by `setup/tools.py` from `conf/*.conf`; edit the modules, not this file\n"
+        f"{_COMPILED_HASH_PREFIX}{modules_hash}\n",
+        f"set-option -g {COMPILED_CONFIG_OPTION} 1\n",
+    ]
+    for module_path in module_paths:
+        sections.append(f"## --- conf/{module_path.name}\n\n{module_path.read_text().rstrip()}\n")
+        if module_path == tool.plugins_file:
+            sections.append(_render_plugin_init(tool=tool))
+    return "\n".join(sections)
+
+
+def compile_tool_config(
+    *,
+    tool: ToolConfig,
+    dry_run: bool,
+) -> None:
+    """Regenerate `tool.compiled_config` from its modules, unless the modules hash recorded in it still matches."""
+    if tool.config_modules_dir is None or tool.compiled_config is None:
         return
-    apply_shell_actions.run_command(
-        args=["git", "clone", "--depth", "1", repo.url,
-              str(repo.output)],
-        script_name=SCRIPT_NAME,
-        description=f"clone {repo.name} (shallow) under {repo.output}",
+    module_paths = sorted(tool.config_modules_dir.glob("*.conf"))
+    if not module_paths:
+        _log_message(f"No config modules found in: {tool.config_modules_dir}")
+        return
+    modules_hash = hash_config_modules(module_paths)
+    if _read_compiled_hash(tool.compiled_config) == modules_hash:
+        _log_message(f"Compiled config up to date: {tool.compiled_config}")
+        return
+    if dry_run:
+        _log_message(f"[dry-run] Would compile {len(module_paths)} module(s) into: {tool.compiled_config}")
+        return
+    write_files.write_file_atomically(
+        tool.compiled_config,
+        content=render_compiled_config(
+            tool=tool,
+            module_paths=module_paths,
+            modules_hash=modules_hash,
+        ),
+    )
+    _log_message(f"Compiled {len(module_paths)} module(s) into: {tool.compiled_config}")
+
+
+def _get_plugin_name(
+    plugin_spec: str,
+) -> str:
+    ## the directory name TPM clones a plugin into
+    return plugin_spec.split("#", 1)[0].rstrip("/").rsplit("/", 1)[-1].removesuffix(".git")
+
+
+def _render_plugin_init(
+    *,
+    tool: ToolConfig,
+) -> str:
+    if tool.plugins_file is None or tool.clone_repo is None:
+        return ""
+    tpm_dir = _format_home_path(tool.clone_repo.output)
+    plugins_dir = _format_home_path(tool.clone_repo.output.parent)
+    plugin_dirs = [
+        f'"{plugins_dir}/{_get_plugin_name(plugin_match.group(1))}"'
+        for plugin_match in _TPM_PLUGIN_PATTERN.finditer(tool.plugins_file.read_text())
+        if _get_plugin_name(plugin_match.group(1)) != tool.clone_repo.output.name
+    ]
+    ## tmux expands `$HOME` in double quotes; the single-quoted loop is left for `sh` to expand
+    init_lines = [
+        "## --- plugin init, resolved from the `@plugin` entries above (replaces `run tpm`)",
+        "",
+        f'set-environment -g TMUX_PLUGIN_MANAGER_PATH "{plugins_dir}/"',
+        f'bind-key I run-shell "{tpm_dir}/bindings/install_plugins"',
+        f'bind-key U run-shell "{tpm_dir}/bindings/update_plugins"',
+        f'bind-key M-u run-shell "{tpm_dir}/bindings/clean_plugins"',
+    ]
+    if plugin_dirs:
+        init_lines.append(
+            f"run-shell 'for plugin_dir in {' '.join(plugin_dirs)}; do "
+            'for tmux_file in "$plugin_dir"/*.tmux; do [ -x "$tmux_file" ] && "$tmux_file" >/dev/null 2>&1; done; '
+            "done; true'",
+        )
+    return "\n".join(init_lines) + "\n"
+
+
+def _format_home_path(
+    path: Path,
+) -> str:
+    try:
+        return f"$HOME/{path.relative_to(HOME_DIR)}"
+    except ValueError:
+        return str(path)
+
+
+def _read_compiled_hash(
+    compiled_config: Path,
+) -> str | None:
+    try:
+        with open(compiled_config) as compiled_file:
+            header_lines = [compiled_file.readline(), compiled_file.readline()]
+    except OSError:
+        return None
+    for header_line in header_lines:
+        if header_line.startswith(_COMPILED_HASH_PREFIX):
+            return header_line[len(_COMPILED_HASH_PREFIX):].strip()
+    return None
+
+
+def plan_tool_actions(
+    *,
+    installed_tool_keys: set[str],
+    dry_run: bool,
+) -> list[schedule_actions.Action]:
+    """Return parent dir, symlink, and clone actions for installed tools; clones land inside the link."""
+    actions: list[schedule_actions.Action] = []
+    for command in sorted(installed_tool_keys):
+        tool = TOOLS[command]
+        prefix = f"tools:{command}"
+        actions.append(
+            schedule_actions.Action(
+                name=f"{prefix}:dir",
+                run=functools.partial(
+                    apply_shell_actions.ensure_dir_exists,
+                    directory=tool.target_dir.parent,
+                    script_name=SCRIPT_NAME,
+                    dry_run=dry_run,
+                ),
+            ),
+        )
+        actions.append(
+            schedule_actions.Action(
+                name=f"{prefix}:link",
+                run=functools.partial(
+                    apply_shell_actions.create_symlinks,
+                    links=[
+                        apply_shell_actions.LinkRequest(
+                            source_path=tool.dotfiles_dir,
+                            target_path=tool.target_dir,
+                        ),
+                    ],
+                    script_name=SCRIPT_NAME,
+                    dry_run=dry_run,
+                ),
+                depends_on=(f"{prefix}:dir", ),
+            ),
+        )
+        ## written to the state dir, so it needs neither the dir nor the link
+        if tool.compiled_config is not None:
+            actions.append(
+                schedule_actions.Action(
+                    name=f"{prefix}:compile",
+                    run=functools.partial(
+                        compile_tool_config,
+                        tool=tool,
+                        dry_run=dry_run,
+                    ),
+                ),
+            )
+        if tool.clone_repo is not None:
+            actions.append(
+                schedule_actions.Action(
+                    name=f"{prefix}:clone",
+                    run=functools.partial(
+                        clone_repos.clone_repo,
+                        repo=tool.clone_repo,
+                        script_name=SCRIPT_NAME,
+                        dry_run=dry_run,
+                    ),
+                    depends_on=(f"{prefix}:link", ),
+                ),
+            )
+        ## one action per plugin, so the scheduler clones them concurrently instead of TPM serially at first start
+        for plugin_repo in get_plugin_repos(tool=tool):
+            actions.append(
+                schedule_actions.Action(
+                    name=f"{prefix}:plugin:{plugin_repo.output.name}",
+                    run=functools.partial(
+                        clone_repos.clone_repo,
+                        repo=plugin_repo,
+                        script_name=SCRIPT_NAME,
+                        dry_run=dry_run,
+                    ),
+                    depends_on=(f"{prefix}:link", ),
+                ),
+            )
+    return actions
+
+
+def plan_actions(
+    *,
+    dry_run: bool,
+    tool_keys: tuple[str, ...] | None = None,
+) -> list[schedule_actions.Action]:
+    """Return the tools layer as scheduler actions; tool detection runs now."""
+    installed_tool_keys = check_installed_tools(
+        tool_keys=tool_keys,
+        dry_run=dry_run,
+    )
+    return plan_tool_actions(
+        installed_tool_keys=installed_tool_keys,
         dry_run=dry_run,
     )
 
@@ -201,12 +448,19 @@ def remove_symlinks(
         ),
     )
     selected_tool_configs = get_selected_tools(tool_keys=tool_keys)
-    for tool in selected_tool_configs.values():
-        apply_shell_actions.remove_symlink(
-            target_path=tool.target_dir,
-            script_name=SCRIPT_NAME,
-            dry_run=dry_run,
-        )
+    target_paths = [tool.target_dir for tool in selected_tool_configs.values()]
+    ## also drop links recorded for tools that have since left `TOOLS`
+    target_paths.extend(
+        record_links.get_orphaned_targets(
+            layer=SCRIPT_NAME,
+            known_targets={tool.target_dir for tool in TOOLS.values()},
+        ),
+    )
+    apply_shell_actions.remove_symlinks(
+        target_paths=target_paths,
+        script_name=SCRIPT_NAME,
+        dry_run=dry_run,
+    )
     _log_message(
         log_messages.format_dry_run(
             message="Finished removing tool config symlinks",
@@ -240,26 +494,12 @@ def run(
             ),
         )
         return
-    for command in sorted(installed_tool_keys):
-        tool = TOOLS[command]
-        apply_shell_actions.ensure_dir_exists(
-            directory=tool.target_dir.parent,
-            script_name=SCRIPT_NAME,
+    schedule_actions.run_actions(
+        actions=plan_tool_actions(
+            installed_tool_keys=installed_tool_keys,
             dry_run=dry_run,
-        )
-        apply_shell_actions.create_symlink(
-            source_path=tool.dotfiles_dir,
-            target_path=tool.target_dir,
-            script_name=SCRIPT_NAME,
-            dry_run=dry_run,
-        )
-    for command in installed_tool_keys:
-        tool = TOOLS[command]
-        if tool.clone_repo is not None:
-            shallow_clone_repo(
-                repo=tool.clone_repo,
-                dry_run=dry_run,
-            )
+        ),
+    )
     _log_message(
         log_messages.format_dry_run(
             message="Finished setting up tool configs",
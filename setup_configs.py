@@ -6,23 +6,37 @@
 
 ## stdlib
 import argparse
+from dataclasses import dataclass
+import functools
+import os
 from pathlib import Path
-from typing import cast
+import stat
+import sys
+from typing import TYPE_CHECKING, cast
 
 ## local
-from setup import editors as setup_editors
-from setup import extras as setup_extras
-from setup import rules as setup_rules
-from setup import shell as setup_shell
-from setup import tools as setup_tools
+## setup layers, the scheduler, and the clone and shell helpers are imported by the functions that use them, so a
+## run skipped by its fingerprint never loads them or their thread-pool and subprocess machinery
+from utils import fingerprint_runs
 from utils import load_profiles
 from utils import log_messages
+from utils import record_links
+
+if TYPE_CHECKING:
+    from utils import clone_repos
+    from utils import schedule_actions
 
 ##
 ## === SCRIPT CONFIG
 ##
 
 SCRIPT_NAME = Path(__file__).name
+## per-user base directories that default to paths under `HOME`
+XDG_HOME_VARIABLES = ("XDG_CACHE_HOME", "XDG_CONFIG_HOME", "XDG_DATA_HOME", "XDG_STATE_HOME")
+## where a fleet child writes besides its links, relative to its home root; children drop the XDG variables, so
+## these are the default locations
+CHILD_MANIFEST_PATH = Path(".local/state/dotfiles/links.json")
+CHILD_STATE_PATHS = (Path(".local/state/dotfiles"), Path(".local/share/nvim"), Path(".cache/dotfiles"))
 
 _log_message = log_messages.make_logger(SCRIPT_NAME)
 
@@ -36,6 +50,10 @@ def validate_profile(
     profile: load_profiles.SystemProfile,
 ) -> bool:
     """Validate profile subscriptions without changing the system."""
+    from setup import editors as setup_editors
+    from setup import extras as setup_extras
+    from setup import shell as setup_shell
+    from setup import tools as setup_tools
     is_valid = True
     known_shells = {shell_config.name for shell_config in setup_shell.SHELLS}
     if profile.shell is not None and profile.shell not in known_shells:
@@ -94,6 +112,328 @@ def validate_profile(
     return is_valid
 
 
+##
+## === ACTION PLANNING
+##
+
+
+def plan_profile_actions(
+    *,
+    profile: load_profiles.SystemProfile,
+    shell: str,
+    dry_run: bool,
+    set_login_shell: bool,
+) -> "list[schedule_actions.Action]":
+    """Collect the actions of every subscribed layer into one dependency graph."""
+    from setup import editors as setup_editors
+    from setup import extras as setup_extras
+    from setup import rules as setup_rules
+    from setup import shell as setup_shell
+    from setup import tools as setup_tools
+    extras_actions = setup_extras.plan_actions(
+        dry_run=dry_run,
+        extra_keys=profile.extras,
+        platform_tags=profile.platforms,
+    )
+    actions = setup_shell.plan_actions(
+        shell=shell,
+        dry_run=dry_run,
+        set_login_shell=set_login_shell,
+        bundle=profile.bundle_shell,
+        ## extras link files the shell bundle inlines, e.g. `.shell_hpc`
+        bundle_after=tuple(action.name for action in extras_actions),
+        platform_tags=profile.platforms,
+    )
+    actions.extend(
+        setup_tools.plan_actions(
+            dry_run=dry_run,
+            tool_keys=profile.tools,
+        ),
+    )
+    actions.extend(
+        setup_editors.plan_actions(
+            dry_run=dry_run,
+            editor_keys=profile.editors,
+        ),
+    )
+    actions.extend(extras_actions)
+    if profile.link_rules:
+        actions.extend(setup_rules.plan_actions(dry_run=dry_run))
+    return actions
+
+
+def remove_profile_symlinks(
+    *,
+    profile: load_profiles.SystemProfile | None,
+    dry_run: bool,
+) -> None:
+    """Remove the links of every subscribed layer; with no profile, remove all known links."""
+    from setup import editors as setup_editors
+    from setup import extras as setup_extras
+    from setup import rules as setup_rules
+    from setup import shell as setup_shell
+    from setup import tools as setup_tools
+    setup_shell.remove_symlinks(
+        dry_run=dry_run,
+    )
+    setup_tools.remove_symlinks(
+        dry_run=dry_run,
+        tool_keys=profile.tools if profile is not None else None,
+    )
+    setup_editors.remove_symlinks(
+        dry_run=dry_run,
+        editor_keys=profile.editors if profile is not None else None,
+    )
+    setup_extras.remove_symlinks(
+        dry_run=dry_run,
+        extra_keys=profile.extras if profile is not None else None,
+    )
+    if profile is None or profile.link_rules:
+        setup_rules.remove_symlinks(dry_run=dry_run)
+
+
+##
+## === LINK STATUS
+##
+
+
+def report_link_status() -> bool:
+    """Report every link recorded in the manifest; return `True` iff all of them are intact."""
+    records = record_links.load_manifest()
+    if not records:
+        _log_message(f"No links recorded in: {record_links.MANIFEST_FILE}")
+        return True
+    is_intact = True
+    for record in sorted(records.values(), key=lambda record: (record.layer, record.target_path)):
+        status = record_links.check_record(record)
+        if status != record_links.LinkStatus.OK:
+            is_intact = False
+        _log_message(f"[{record.layer}] {status.value}: {record.target_path} -> {record.source_path}")
+    return is_intact
+
+
+##
+## === REPO UPDATES
+##
+
+
+def get_managed_repos() -> "list[clone_repos.RepoConfig]":
+    """Return every checkout the layers clone, whether or not this profile subscribes to it."""
+    from setup import editors as setup_editors
+    from setup import tools as setup_tools
+    repos = [tool.clone_repo for tool in setup_tools.TOOLS.values() if tool.clone_repo is not None]
+    repos.extend(repo for tool in setup_tools.TOOLS.values() for repo in setup_tools.get_plugin_repos(tool=tool))
+    repos.extend(editor.clone_repo for editor in setup_editors.EDITORS.values() if editor.clone_repo is not None)
+    return repos
+
+
+def update_managed_repos(
+    *,
+    max_workers: int,
+    timeout_seconds: float,
+    dry_run: bool,
+) -> bool:
+    """Fast-forward every cloned managed checkout at once and report its revisions; return `True` iff none failed."""
+    from utils import clone_repos
+    repos = [repo for repo in get_managed_repos() if repo.output.exists()]
+    if not repos:
+        _log_message("No managed checkouts are cloned yet.")
+        return True
+    if dry_run:
+        for repo in repos:
+            _log_message(f"[dry-run] Would run: fast-forward {repo.name} under {repo.output}")
+        return True
+    _log_message(f"Updating {len(repos)} checkout(s) on up to {max_workers} worker(s).")
+    results = clone_repos.update_repos(
+        repos=repos,
+        max_workers=max_workers,
+        timeout_seconds=timeout_seconds,
+    )
+    for result in results:
+        old_revision = (result.old_revision or "?")[:12]
+        new_revision = (result.new_revision or "?")[:12]
+        if result.error is not None:
+            _log_message(f"failed: {result.repo.name} at {old_revision}: {result.error}")
+        elif old_revision == new_revision:
+            _log_message(f"up to date: {result.repo.name} at {new_revision}")
+        else:
+            _log_message(f"updated: {result.repo.name} {old_revision} -> {new_revision}")
+    return all(result.error is None for result in results)
+
+
+##
+## === FLEET MODE
+##
+
+
+@dataclass(frozen=True)
+class HomeResult:
+    """Outcome of applying the profile to one home root."""
+
+    home_dir: Path
+    return_code: int
+    output: str
+
+
+def read_home_list(
+    list_file: Path,
+) -> list[Path]:
+    """Read one home root per line; blank lines and `#` comments are ignored."""
+    home_dirs: list[Path] = []
+    for line in list_file.read_text().splitlines():
+        home_name = line.split("#", 1)[0].strip()
+        if home_name:
+            home_dirs.append(Path(home_name).expanduser())
+    return home_dirs
+
+
+def provision_homes(
+    *,
+    home_dirs: list[Path],
+    child_args: list[str],
+    max_workers: int,
+    show_output: bool,
+) -> bool:
+    """
+  Apply the profile to every home root in its own child process; return `True` iff all of them succeed.
+
+  Layer registries bind their paths from `Path.home()` at import time, so each child runs this script with
+  `HOME` pointed at one root. Children never call `chsh`, since that would change the invoking account. With
+  `show_output`, each child's full output is printed with its home root as a prefix; otherwise only the tail of a
+  failed child's output is.
+  """
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            executor.map(
+                functools.partial(
+                    _provision_home,
+                    child_args=child_args,
+                ),
+                home_dirs,
+            ),
+        )
+    failed_results = [result for result in results if result.return_code != 0]
+    if show_output:
+        for result in results:
+            for output_line in result.output.splitlines():
+                if output_line.strip():
+                    print(f"{result.home_dir}: {output_line}")
+    for result in results:
+        outcome = "ok" if result.return_code == 0 else f"failed (exit {result.return_code})"
+        _log_message(f"{outcome}: {result.home_dir}")
+    if not show_output:
+        for result in failed_results:
+            output_tail = "\n".join(result.output.strip().splitlines()[-10:])
+            _log_message(f"Last output for {result.home_dir}:\n{output_tail}")
+    _log_message(f"Provisioned {len(results) - len(failed_results)}/{len(results)} home root(s).")
+    return not failed_results
+
+
+def _provision_home(
+    home_dir: Path,
+    *,
+    child_args: list[str],
+) -> HomeResult:
+    import subprocess
+    from utils import clone_repos
+    child_env = dict(os.environ)
+    child_env["HOME"] = str(home_dir)
+    ## state, data, cache and config dirs must follow the home root, not the invoking account
+    for xdg_variable in XDG_HOME_VARIABLES:
+        child_env.pop(xdg_variable, None)
+    ## git mirrors are shared by every home, so each repo is fetched from the network once per fleet
+    child_env.setdefault("DOTFILES_GIT_MIRRORS", str(clone_repos.MIRROR_CACHE_DIR))
+    completed = subprocess.run(
+        args=[sys.executable, str(Path(__file__).resolve()), "--no-login-shell", *child_args],
+        env=child_env,
+        capture_output=True,
+        text=True,
+    )
+    return_code = completed.returncode
+    output = completed.stdout + completed.stderr
+    home_stat = home_dir.stat()
+    if home_stat.st_uid != os.geteuid():
+        try:
+            hand_over_home(
+                home_dir=home_dir,
+                owner_uid=home_stat.st_uid,
+                owner_gid=home_stat.st_gid,
+            )
+        except OSError as error:
+            output += f"\nCould not hand created paths to the owner of {home_dir}: {error}\n"
+            return_code = return_code or 1
+    return HomeResult(
+        home_dir=home_dir,
+        return_code=return_code,
+        output=output,
+    )
+
+
+def hand_over_home(
+    *,
+    home_dir: Path,
+    owner_uid: int,
+    owner_gid: int,
+) -> None:
+    """
+  Give every path the invoking account created under `home_dir` to the home's owner.
+
+  Only the paths a run writes are visited: the entries at the top of the home, and the way down to each recorded
+  link, the state and cache dirs, and each managed checkout. The first path on each way that the invoking account
+  owns was created by a run, so it is handed over along with everything inside it that the invoking account owns.
+  """
+    invoker_uid = os.geteuid()
+    manifest = record_links.load_manifest(manifest_file=home_dir / CHILD_MANIFEST_PATH)
+    written_paths = [Path(entry.name) for entry in os.scandir(home_dir)]
+    written_paths.extend(CHILD_STATE_PATHS)
+    written_paths.extend(
+        target_path.relative_to(home_dir) for target_path in manifest if target_path.is_relative_to(home_dir)
+    )
+    ## checkout paths are bound from the invoking account's home, so they are rebased onto `home_dir`
+    written_paths.extend(
+        repo.output.relative_to(Path.home()) for repo in get_managed_repos() if repo.output.is_relative_to(Path.home())
+    )
+    handed_paths: set[Path] = set()
+    for written_path in written_paths:
+        current_path = home_dir
+        for part in written_path.parts:
+            current_path = current_path / part
+            try:
+                path_stat = os.lstat(current_path)
+            except FileNotFoundError:
+                break
+            if path_stat.st_uid == invoker_uid:
+                if current_path not in handed_paths:
+                    handed_paths.add(current_path)
+                    _hand_over_tree(
+                        root_path=current_path,
+                        invoker_uid=invoker_uid,
+                        owner_uid=owner_uid,
+                        owner_gid=owner_gid,
+                    )
+                break
+            if not stat.S_ISDIR(path_stat.st_mode):
+                break
+
+
+def _hand_over_tree(
+    *,
+    root_path: Path,
+    invoker_uid: int,
+    owner_uid: int,
+    owner_gid: int,
+) -> None:
+    os.lchown(root_path, owner_uid, owner_gid)
+    if root_path.is_symlink() or not root_path.is_dir():
+        return
+    for dir_path, dir_names, file_names in os.walk(root_path):
+        for entry_name in dir_names + file_names:
+            entry_path = os.path.join(dir_path, entry_name)
+            if os.lstat(entry_path).st_uid == invoker_uid:
+                os.lchown(entry_path, owner_uid, owner_gid)
+
+
 ##
 ## === PROGRAM MAIN
 ##
@@ -113,6 +453,65 @@ def main():
         action="store_true",
         help="Remove dotfile symlinks for the selected profile, or all if no profile exists",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        metavar="N",
+        help="Run up to N independent setup actions at once (default: CPU count, up to 8; 8 for `--update-repos`)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Apply the profile even if nothing changed since the last successful run",
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="Report the state of every recorded dotfile symlink and exit",
+    )
+    parser.add_argument(
+        "--no-login-shell",
+        action="store_true",
+        help="Never call `chsh`, even if the profile sets `set_login_shell`",
+    )
+    parser.add_argument(
+        "--home-root",
+        nargs="+",
+        type=Path,
+        default=[],
+        metavar="DIR",
+        help="Apply the profile to each home root DIR instead of the current home",
+    )
+    parser.add_argument(
+        "--home-list",
+        type=Path,
+        metavar="FILE",
+        help="Read additional home roots from FILE, one per line",
+    )
+    parser.add_argument(
+        "--home-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        metavar="N",
+        help="Provision up to N home roots at once",
+    )
+    parser.add_argument(
+        "--events-file",
+        type=Path,
+        metavar="FILE",
+        help="Append one JSON object per timed setup action to FILE",
+    )
+    parser.add_argument(
+        "--update-repos",
+        action="store_true",
+        help="Fast-forward every cloned managed checkout (TPM and its plugins, Doom Emacs) in parallel and exit",
+    )
+    parser.add_argument(
+        "--repo-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="With `--update-repos`, give up on a checkout after SECONDS (default: 120)",
+    )
     parser.add_argument(
         "--check-profile",
         action="store_true",
@@ -122,7 +521,87 @@ def main():
     dry_run = cast(bool, args.dry_run)
     remove_symlinks = cast(bool, args.remove_symlinks)
     check_profile = cast(bool, args.check_profile)
-    log_messages.configure(write_to_file=not (dry_run or check_profile))
+    show_status = cast(bool, args.status)
+    force = cast(bool, args.force)
+    update_repos = cast(bool, args.update_repos)
+    jobs = cast(int | None, args.jobs)
+    if jobs is not None and jobs < 1:
+        parser.error("`--jobs` must be at least 1")
+    skip_login_shell = cast(bool, args.no_login_shell)
+    events_file = cast(Path | None, args.events_file)
+    if events_file is not None:
+        events_file = events_file.expanduser().resolve()
+    home_dirs = list(cast(list[Path], args.home_root))
+    home_list_file = cast(Path | None, args.home_list)
+    if home_list_file is not None:
+        home_dirs.extend(read_home_list(home_list_file))
+    ## cron re-runs usually change nothing, so skip profile parsing and every layer when inputs match
+    is_apply_run = not (dry_run or remove_symlinks or check_profile or show_status or update_repos or home_dirs)
+    if is_apply_run and not force:
+        if fingerprint_runs.fingerprint_matches(fingerprint_runs.compute_fingerprint()):
+            ## a skipped run leaves the log file untouched, so no-op cron runs do not grow it
+            log_messages.configure(write_to_file=False)
+            _log_message("Nothing changed since the last successful run; pass `--force` to re-apply.")
+            return
+    from utils import apply_shell_actions
+    from utils import clone_repos
+    from utils import schedule_actions
+    if jobs is None:
+        ## repo updates wait on the network, not the CPU, so they default to more workers
+        jobs = clone_repos.UPDATE_MAX_WORKERS if update_repos else schedule_actions.DEFAULT_MAX_WORKERS
+    repo_timeout = cast(float | None, args.repo_timeout)
+    if repo_timeout is None:
+        repo_timeout = float(clone_repos.UPDATE_TIMEOUT_SECONDS)
+    if home_dirs:
+        missing_home_dirs = [str(home_dir) for home_dir in home_dirs if not home_dir.is_dir()]
+        if missing_home_dirs:
+            parser.error(f"home root(s) do not exist: {', '.join(missing_home_dirs)}")
+        home_workers = cast(int, args.home_workers)
+        if home_workers < 1:
+            parser.error("`--home-workers` must be at least 1")
+        if check_profile:
+            parser.error("`--check-profile` cannot be combined with `--home-root` or `--home-list`")
+        child_flags = {
+            "--dry-run": dry_run,
+            "--remove-symlinks": remove_symlinks,
+            "--force": force,
+            "--status": show_status,
+            "--update-repos": update_repos,
+        }
+        child_args = [flag for flag, is_set in child_flags.items() if is_set] + ["--jobs", str(jobs)]
+        if update_repos:
+            ## each home keeps its own checkouts, so each child fast-forwards the ones under its root
+            child_args += ["--repo-timeout", str(repo_timeout)]
+        if events_file is not None:
+            ## every child appends to the same sink; each event line carries its `home`
+            child_args += ["--events-file", str(events_file)]
+        log_messages.configure(write_to_file=False)
+        if not provision_homes(
+                home_dirs=list(dict.fromkeys(home_dir.resolve() for home_dir in home_dirs)),
+                child_args=child_args,
+                max_workers=home_workers,
+                ## dry runs and status reports are only useful if every home's report is shown
+                show_output=dry_run or show_status,
+        ):
+            raise SystemExit(1)
+        return
+    if update_repos:
+        log_messages.configure(write_to_file=not dry_run)
+        if not update_managed_repos(
+                max_workers=jobs,
+                timeout_seconds=repo_timeout,
+                dry_run=dry_run,
+        ):
+            raise SystemExit(1)
+        return
+    log_messages.configure(
+        write_to_file=not (dry_run or check_profile or show_status),
+        events_file=events_file,
+    )
+    if show_status:
+        if not report_link_status():
+            raise SystemExit(1)
+        return
     profile = load_profiles.load_profile(
         required=not remove_symlinks,
     )
@@ -134,23 +613,10 @@ def main():
         return
     ## no `this-system.toml` means remove all known links
     if remove_symlinks:
-        setup_shell.remove_symlinks(
+        remove_profile_symlinks(
+            profile=profile,
             dry_run=dry_run,
         )
-        setup_tools.remove_symlinks(
-            dry_run=dry_run,
-            tool_keys=profile.tools if profile is not None else None,
-        )
-        setup_editors.remove_symlinks(
-            dry_run=dry_run,
-            editor_keys=profile.editors if profile is not None else None,
-        )
-        setup_extras.remove_symlinks(
-            dry_run=dry_run,
-            extra_keys=profile.extras if profile is not None else None,
-        )
-        if profile is None or profile.link_rules:
-            setup_rules.remove_symlinks(dry_run=dry_run)
         return
     if profile is None:
         parser.error("`this-system.toml` is required unless `--remove-symlinks` is specified")
@@ -160,26 +626,25 @@ def main():
             "`shell` is missing from `this-system.toml`; "
             'add `shell = "zsh"` or `shell = "bash"`.',
         )
-    setup_shell.run(
+    actions = plan_profile_actions(
+        profile=profile,
         shell=shell_name,
         dry_run=dry_run,
-        set_login_shell=profile.set_login_shell,
-    )
-    setup_tools.run(
-        dry_run=dry_run,
-        tool_keys=profile.tools,
+        set_login_shell=profile.set_login_shell and not skip_login_shell,
     )
-    setup_editors.run(
-        dry_run=dry_run,
-        editor_keys=profile.editors,
+    _log_message(f"Scheduling {len(actions)} action(s) on up to {jobs} worker(s).")
+    schedule_actions.run_actions(
+        actions=actions,
+        max_workers=jobs,
     )
-    setup_extras.run(
-        dry_run=dry_run,
-        extra_keys=profile.extras,
-        platform_tags=profile.platforms,
-    )
-    if profile.link_rules:
-        setup_rules.run(dry_run=dry_run)
+    if dry_run:
+        return
+    ## a failed clone or install must be retried next run, so only clean runs are fingerprinted
+    failed_commands = apply_shell_actions.get_failed_commands()
+    if failed_commands:
+        _log_message(f"Not saving the run fingerprint; {len(failed_commands)} command(s) failed.")
+        return
+    fingerprint_runs.save_fingerprint(fingerprint_runs.compute_fingerprint())
 
 
 ##
@@ -1,43 +1,43 @@
 #!/bin/bash
 
 ##
-## === BATTERY INFO
+## === CACHED STATUS LINE
 ##
 
-battery_status="N/A"
-if command -v pmset &>/dev/null; then
-    ## macOS
-    power_source=$(pmset -g batt | grep "Now drawing from" | awk -F"'" '{print $2}')
-    battery_level=$(LANG=C pmset -g batt | grep -o '[0-9]\+%' | head -1 | tr -d '%')
-    if [[ "$power_source" == "AC Power" ]]; then
-        battery_status="${battery_level}%+"
-    else
-        battery_status="${battery_level}%-"
-    fi
-elif [[ -d /sys/class/power_supply/ ]]; then
-    ## linux (e.g., battery in /sys)
-    battery_dir=$(find /sys/class/power_supply/ -maxdepth 1 -name 'BAT*' | head -n 1)
-    if [[ -n "$battery_dir" ]]; then
-        capacity=$(cat "$battery_dir/capacity" 2>/dev/null)
-        status=$(cat "$battery_dir/status" 2>/dev/null)
-        battery_status="${capacity}%"
-        [[ "$status" == "Charging" ]] && battery_status="${battery_status}+"
-        [[ "$status" == "Discharging" ]] && battery_status="${battery_status}-"
-    fi
+## `sysinfo_sampler.py` samples battery, CPU and memory in the background and caches one status line;
+## this only reads it, using bash builtins so a status refresh never forks or waits on a sample
+cache_dir="${DOTFILES_SYSINFO_CACHE:-${XDG_RUNTIME_DIR:-${TMPDIR:-/tmp}}/dotfiles-sysinfo-${UID}}"
+status_line="Charge: N/A | CPU: N/A | MEM: N/A"
+if [[ -r "$cache_dir/status" ]]; then
+    IFS= read -r status_line < "$cache_dir/status"
 fi
 
 ##
-## === MEMORY + CPU STATS
+## === SAMPLER
 ##
 
-tmux_mem_cpu_load=$(command -v tmux-mem-cpu-load || echo "/opt/homebrew/bin/tmux-mem-cpu-load")
-mem_used="N/A"
-cpu_used="N/A"
-if [[ -x "$tmux_mem_cpu_load" ]]; then
-    system_stats=$("$tmux_mem_cpu_load" --interval 1 2>/dev/null)
-    if [[ $system_stats =~ ^([0-9]+/[0-9]+GB)[[:space:]]+\[.*\][[:space:]]+([0-9.]+%) ]]; then
-        mem_used="${BASH_REMATCH[1]}"
-        cpu_used="${BASH_REMATCH[2]}"
+## start a sampler when none is running; one sampler serves every tmux server sharing `cache_dir`. the sampler
+## removes its pid file on exit, and where `/proc` exists the pid must also belong to a sampler, so a PID reused
+## after a `kill -9` does not stop a new one from starting
+sampler_pid=""
+if [[ -r "$cache_dir/pid" ]]; then
+    read -r sampler_pid < "$cache_dir/pid"
+fi
+is_sampler_alive=""
+if [[ -n "$sampler_pid" ]] && kill -0 "$sampler_pid" 2>/dev/null; then
+    if [[ -r "/proc/$sampler_pid/cmdline" ]]; then
+        while IFS= read -r -d '' sampler_arg; do
+            if [[ "$sampler_arg" == */sysinfo_sampler.py ]]; then
+                is_sampler_alive=1
+            fi
+        done < "/proc/$sampler_pid/cmdline"
+    elif [[ ! -d /proc/self ]]; then
+        is_sampler_alive=1
+    fi
+fi
+if [[ -z "$is_sampler_alive" ]]; then
+    if command -v python3 &>/dev/null; then
+        nohup python3 "${BASH_SOURCE[0]%/*}/sysinfo_sampler.py" --cache-dir "$cache_dir" &>/dev/null &
     fi
 fi
 
@@ -45,6 +45,6 @@ fi
 ## === OUTPUT
 ##
 
-echo "Charge: $battery_status | CPU: $cpu_used | MEM: $mem_used"
+echo "$status_line"
 
 ## .
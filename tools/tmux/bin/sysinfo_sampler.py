@@ -0,0 +1,279 @@
+## { SCRIPT
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+import argparse
+import fcntl
+import os
+from pathlib import Path
+import re
+import signal
+import subprocess
+import time
+from types import FrameType
+from typing import cast
+
+##
+## === SAMPLER CONFIG
+##
+
+## must match the default in `sysinfo.sh`, which reads what this writes
+DEFAULT_CACHE_DIR = Path(
+    os.environ.get("DOTFILES_SYSINFO_CACHE") or
+    Path(os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp") / f"dotfiles-sysinfo-{os.getuid()}",
+)
+SAMPLE_INTERVAL_SECONDS = 5.0  # matches `status-interval`
+## how often the sampler checks that a tmux server still wants its output
+IDLE_CHECK_SECONDS = 60.0
+POWER_SUPPLY_DIR = Path("/sys/class/power_supply")
+HAS_PROC = Path("/proc/stat").exists()
+NOT_AVAILABLE = "N/A"
+
+##
+## === SAMPLING FUNCTIONS
+##
+
+
+def read_cpu_times() -> tuple[int, int]:
+    """Return `(busy, total)` jiffies across all CPUs from the first line of `/proc/stat`."""
+    with open("/proc/stat", "rb") as stat_file:
+        fields = [int(field) for field in stat_file.readline().split()[1:]]
+    ## `idle` and `iowait` are the only non-busy states
+    idle_jiffies = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    total_jiffies = sum(fields[:8])
+    return total_jiffies - idle_jiffies, total_jiffies
+
+
+def format_cpu_usage(
+    *,
+    previous_times: tuple[int, int],
+    current_times: tuple[int, int],
+) -> str:
+    busy_delta = current_times[0] - previous_times[0]
+    total_delta = current_times[1] - previous_times[1]
+    if total_delta <= 0:
+        return NOT_AVAILABLE
+    return f"{100 * busy_delta / total_delta:.1f}%"
+
+
+def read_memory_usage() -> str:
+    """Return used/total memory like `tmux-mem-cpu-load` does, e.g. `5/16GB`, from `/proc/meminfo`."""
+    meminfo_kib: dict[str, int] = {}
+    with open("/proc/meminfo", "rb") as meminfo_file:
+        for line in meminfo_file:
+            name, _, value = line.partition(b":")
+            if name in (b"MemTotal", b"MemAvailable"):
+                meminfo_kib[name.decode()] = int(value.split()[0])
+    if len(meminfo_kib) < 2:
+        return NOT_AVAILABLE
+    kib_per_gib = 1024 * 1024
+    used_gib = (meminfo_kib["MemTotal"] - meminfo_kib["MemAvailable"]) // kib_per_gib
+    total_gib = meminfo_kib["MemTotal"] // kib_per_gib
+    return f"{used_gib}/{total_gib}GB"
+
+
+def read_battery_status() -> str:
+    """Return e.g. `85%+` while charging or `85%-` while discharging, from the first `BAT*` power supply."""
+    try:
+        battery_dirs = sorted(POWER_SUPPLY_DIR.glob("BAT*"))
+    except OSError:
+        return NOT_AVAILABLE
+    if not battery_dirs:
+        return NOT_AVAILABLE
+    try:
+        capacity = (battery_dirs[0] / "capacity").read_text().strip()
+        status = (battery_dirs[0] / "status").read_text().strip()
+    except OSError:
+        return NOT_AVAILABLE
+    suffix = {"Charging": "+", "Discharging": "-"}.get(status, "")
+    return f"{capacity}%{suffix}"
+
+
+def sample_with_helpers() -> tuple[str, str, str]:
+    """
+  Return `(battery, cpu, memory)` on systems without `/proc`, e.g. macOS, via `pmset` and `tmux-mem-cpu-load`.
+
+  These block for about a second, which only delays this background sampler, never the status bar.
+  """
+    battery_status = cpu_usage = memory_usage = NOT_AVAILABLE
+    pmset_output = _run_helper(["pmset", "-g", "batt"])
+    battery_match = re.search(r"(\d+)%", pmset_output)
+    if battery_match is not None:
+        suffix = "+" if "AC Power" in pmset_output else "-"
+        battery_status = f"{battery_match.group(1)}%{suffix}"
+    stats_output = _run_helper(["tmux-mem-cpu-load", "--interval", "1"])
+    stats_match = re.match(r"([0-9]+/[0-9]+GB)\s+\[.*\]\s+([0-9.]+%)", stats_output)
+    if stats_match is not None:
+        memory_usage, cpu_usage = stats_match.group(1), stats_match.group(2)
+    return battery_status, cpu_usage, memory_usage
+
+
+def format_status_line(
+    *,
+    battery_status: str,
+    cpu_usage: str,
+    memory_usage: str,
+) -> str:
+    return f"Charge: {battery_status} | CPU: {cpu_usage} | MEM: {memory_usage}"
+
+
+def sample_status_line(
+    previous_cpu_times: tuple[int, int],
+) -> tuple[str, tuple[int, int]]:
+    """Return the status line and the CPU times to diff the next sample against."""
+    if not HAS_PROC:
+        battery_status, cpu_usage, memory_usage = sample_with_helpers()
+        return format_status_line(
+            battery_status=battery_status,
+            cpu_usage=cpu_usage,
+            memory_usage=memory_usage,
+        ), previous_cpu_times
+    current_cpu_times = read_cpu_times()
+    status_line = format_status_line(
+        battery_status=read_battery_status(),
+        cpu_usage=format_cpu_usage(
+            previous_times=previous_cpu_times,
+            current_times=current_cpu_times,
+        ),
+        memory_usage=read_memory_usage(),
+    )
+    return status_line, current_cpu_times
+
+
+def write_status_line(
+    cache_dir: Path,
+    status_line: str,
+) -> None:
+    ## replaced atomically, so a status refresh never reads a half-written line
+    temp_path = cache_dir / f".status.{os.getpid()}.tmp"
+    temp_path.write_text(f"{status_line}\n")
+    os.replace(temp_path, cache_dir / "status")
+
+
+def _run_helper(
+    args: list[str],
+) -> str:
+    try:
+        completed = subprocess.run(
+            args,
+            capture_output=True,
+            text=True,
+            timeout=10,
+            check=False,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return completed.stdout
+
+
+def _exit_on_signal(
+    signal_number: int,
+    _frame: FrameType | None,
+) -> None:
+    ## unwinds through `run_sampler`'s `finally`, so the pid file is removed on `kill` too
+    raise SystemExit(128 + signal_number)
+
+
+def _is_tmux_running() -> bool:
+    try:
+        completed = subprocess.run(
+            ["tmux", "list-sessions"],
+            capture_output=True,
+            check=False,
+        )
+    except OSError:
+        return False
+    return completed.returncode == 0
+
+
+##
+## === PROGRAM MAIN
+##
+
+
+def run_sampler(
+    *,
+    cache_dir: Path,
+    interval_seconds: float,
+) -> None:
+    """
+  Sample until no tmux server is left, rewriting `cache_dir/status` every `interval_seconds`.
+
+  One sampler runs per cache dir: it holds an exclusive lock on `cache_dir/lock`, and later starts exit at once,
+  so every tmux server pointed at the same cache dir shares one sampler. `cache_dir/pid` names the lock holder
+  and is removed before the lock is released, so `sysinfo.sh` never mistakes a reused PID for a live sampler.
+  """
+    cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    ## held open, and so locked, for as long as this sampler runs
+    lock_file = open(cache_dir / "lock", "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return
+    pid_path = cache_dir / "pid"
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    pid_path.write_text(f"{os.getpid()}\n")
+    try:
+        cpu_times = read_cpu_times() if HAS_PROC else (0, 0)
+        next_idle_check = time.monotonic() + IDLE_CHECK_SECONDS
+        ## the first line is written after a short sample so a new session does not show `N/A` for a full interval
+        sleep_seconds = min(0.5, interval_seconds)
+        while True:
+            time.sleep(sleep_seconds)
+            sleep_seconds = interval_seconds
+            status_line, cpu_times = sample_status_line(cpu_times)
+            write_status_line(cache_dir, status_line)
+            if time.monotonic() >= next_idle_check:
+                if not _is_tmux_running():
+                    return
+                next_idle_check = time.monotonic() + IDLE_CHECK_SECONDS
+    finally:
+        pid_path.unlink(missing_ok=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Sample battery, CPU and memory in the background for the tmux status bar.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        metavar="DIR",
+        help="Write the status line to DIR/status; tmux servers sharing DIR share one sampler",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=SAMPLE_INTERVAL_SECONDS,
+        metavar="SECONDS",
+        help="Seconds between samples",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Print one status line and exit",
+    )
+    args = parser.parse_args()
+    if cast(bool, args.once):
+        cpu_times = read_cpu_times() if HAS_PROC else (0, 0)
+        time.sleep(0.5)
+        print(sample_status_line(cpu_times)[0])
+        return
+    run_sampler(
+        cache_dir=cast(Path, args.cache_dir).expanduser(),
+        interval_seconds=cast(float, args.interval),
+    )
+
+
+##
+## === ENTRY POINT
+##
+
+if __name__ == "__main__":
+    main()
+
+## } SCRIPT
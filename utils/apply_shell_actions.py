@@ -5,12 +5,117 @@
 ##
 
 ## stdlib
+from dataclasses import dataclass
+from enum import Enum, auto
+import os
 from pathlib import Path
+import stat
 import subprocess
 from typing import cast
 
 ## local
-from utils import log_messages
+from utils import log_messages, record_links
+
+##
+## === MODULE CONFIG
+##
+
+_failed_commands: list[str] = []  # descriptions of failed `run_command` calls in this process
+
+##
+## === LINK PLAN TYPES
+##
+
+
+class LinkActionKind(Enum):
+    LINK = auto()
+    BACKUP_AND_RELINK = auto()
+    SKIP_ALREADY_LINKED = auto()
+    SKIP_MISSING_SOURCE = auto()
+    SKIP_BROKEN_SYMLINK = auto()
+    SKIP_TYPE_MISMATCH = auto()
+
+
+@dataclass(frozen=True)
+class PathSnapshot:
+    """
+  Filesystem metadata captured once for one path.
+
+  Fields
+  ---
+  - `lstat_result`:
+      `os.lstat` of the path itself; `None` when nothing exists at the path.
+
+  - `link_value`:
+      Raw `os.readlink` value; `None` unless the path is a symlink.
+
+  - `stat_result`:
+      `os.stat` of what the path resolves to; `None` when missing or a broken symlink.
+  """
+
+    path: Path
+    lstat_result: os.stat_result | None = None
+    link_value: str | None = None
+    stat_result: os.stat_result | None = None
+
+    @property
+    def is_missing(self) -> bool:
+        return self.lstat_result is None
+
+    @property
+    def is_symlink(self) -> bool:
+        return self.lstat_result is not None and stat.S_ISLNK(self.lstat_result.st_mode)
+
+    @property
+    def exists(self) -> bool:
+        return self.stat_result is not None
+
+    @property
+    def is_broken_symlink(self) -> bool:
+        return self.is_symlink and not self.exists
+
+    @property
+    def is_file(self) -> bool:
+        return self.stat_result is not None and stat.S_ISREG(self.stat_result.st_mode)
+
+    @property
+    def is_dir(self) -> bool:
+        return self.stat_result is not None and stat.S_ISDIR(self.stat_result.st_mode)
+
+    @property
+    def identity(self) -> tuple[int, int] | None:
+        """Return `(st_dev, st_ino)` of the resolved path; equal identities mean the same file."""
+        if self.stat_result is None:
+            return None
+        return (self.stat_result.st_dev, self.stat_result.st_ino)
+
+    @property
+    def path_type(self) -> str:
+        """Return a description of the path type: file, dir, symlink, broken symlink, or unknown."""
+        if self.is_dir:
+            return "dir"
+        elif self.is_file:
+            return "file"
+        elif self.is_symlink:
+            return "broken symlink" if not self.exists else "symlink"
+        return "unknown"
+
+
+@dataclass(frozen=True)
+class LinkRequest:
+    """One symlink a layer wants: `target_path` pointing at `source_path`."""
+
+    source_path: Path
+    target_path: Path
+
+
+@dataclass(frozen=True)
+class LinkAction:
+    """One planned step, decided from the source and target snapshots."""
+
+    kind: LinkActionKind
+    source: PathSnapshot
+    target: PathSnapshot
 
 ##
 ## === PUBLIC ACTIONS
@@ -32,21 +137,37 @@ def run_command(
         log_messages.log_message(script_name=script_name, message=f"[dry-run] Would run: {description}")
         return True
     log_messages.log_message(script_name=script_name, message=f"Running: {description}")
-    try:
-        subprocess.run(
-            args=args,
-            check=True,
-            capture_output=capture_output,
-            text=capture_output,
-        )
-        log_messages.log_message(script_name=script_name, message=f"Done: {description}")
-        return True
-    except subprocess.CalledProcessError as e:
-        stderr_value = cast(object, e.stderr)
-        stderr = stderr_value if isinstance(stderr_value, str) else ""
-        error_output = stderr.strip() if (capture_output and stderr) else "(no output captured)"
-        log_messages.log_message(script_name=script_name, message=f"Failed: {description}\n{error_output}")
-        return False
+    if not capture_output:
+        ## the command writes straight to the terminal, so queued entries and this action's buffered ones (e.g. the
+        ## `Running:` line) must land first; callers run it as an exclusive action so no other output interleaves
+        log_messages.flush()
+    with log_messages.timed_event(
+        layer=_get_layer_name(script_name),
+        action="command",
+        target=description,
+    ) as event:
+        try:
+            subprocess.run(
+                args=args,
+                check=True,
+                capture_output=capture_output,
+                text=capture_output,
+            )
+            log_messages.log_message(script_name=script_name, message=f"Done: {description}")
+            return True
+        except subprocess.CalledProcessError as e:
+            stderr_value = cast(object, e.stderr)
+            stderr = stderr_value if isinstance(stderr_value, str) else ""
+            error_output = stderr.strip() if (capture_output and stderr) else "(no output captured)"
+            log_messages.log_message(script_name=script_name, message=f"Failed: {description}\n{error_output}")
+            _failed_commands.append(description)
+            event.outcome = "failed"
+            return False
+
+
+def get_failed_commands() -> list[str]:
+    """Return descriptions of every `run_command` that failed in this process."""
+    return list(_failed_commands)
 
 
 def ensure_dir_exists(
@@ -67,7 +188,12 @@ def ensure_dir_exists(
             message=f"[dry-run] Would create directory: {directory}",
         )
     else:
-        directory.mkdir(parents=True, exist_ok=True)
+        with log_messages.timed_event(
+            layer=_get_layer_name(script_name),
+            action="mkdir",
+            target=directory,
+        ):
+            directory.mkdir(parents=True, exist_ok=True)
         log_messages.log_message(
             script_name=script_name,
             message=f"Created directory: {directory}",
@@ -86,121 +212,134 @@ def backup_file(
   If the target is a symlink, remove it. If it is a real file or directory, rename it with a timestamp.
   Return the backup path if a rename was performed, otherwise return None.
   """
+    target = snapshot_path(target_path)
     ## skip if nothing exists at the path
-    if not target_path.exists() and not target_path.is_symlink():
+    if target.is_missing:
         return None
-    ## handle symbolic links separately
-    if target_path.is_symlink():
-        try:
-            ## attempt to resolve what the symlink points to (may fail if broken)
-            resolved = target_path.resolve()
-            log_messages.log_message(
-                script_name=script_name,
-                message=log_messages.format_dry_run(
-                    message=f"{target_path} (symlink) -> {resolved}",
-                    dry_run=dry_run,
+    return _backup_snapshot(
+        target=target,
+        script_name=script_name,
+        dry_run=dry_run,
+    )
+
+
+def snapshot_path(
+    path: Path,
+) -> PathSnapshot:
+    """
+  Capture the metadata of one path with a single `os.lstat`.
+
+  Symlinks cost one extra `os.readlink` and one `os.stat` to capture what they point to.
+  """
+    try:
+        lstat_result = os.lstat(path)
+    except OSError:
+        return PathSnapshot(path=path)
+    if not stat.S_ISLNK(lstat_result.st_mode):
+        return PathSnapshot(
+            path=path,
+            lstat_result=lstat_result,
+            stat_result=lstat_result,
+        )
+    link_value = os.readlink(path)
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        stat_result = None
+    return PathSnapshot(
+        path=path,
+        lstat_result=lstat_result,
+        link_value=link_value,
+        stat_result=stat_result,
+    )
+
+
+def plan_symlinks(
+    *,
+    links: list[LinkRequest],
+) -> tuple[LinkAction, ...]:
+    """
+  Build an immutable plan of link actions from one snapshot per source and target.
+
+  Planning never touches the filesystem beyond the snapshots; pass the plan to `apply_link_plan`.
+  """
+    plan: list[LinkAction] = []
+    for link in links:
+        source = snapshot_path(link.source_path)
+        target = snapshot_path(link.target_path)
+        plan.append(
+            LinkAction(
+                kind=_classify_link(
+                    source=source,
+                    target=target,
                 ),
+                source=source,
+                target=target,
+            ),
+        )
+    return tuple(plan)
+
+
+def apply_link_plan(
+    *,
+    plan: tuple[LinkAction, ...],
+    script_name: str,
+    dry_run: bool = False,
+) -> None:
+    """Execute a link plan, logging one outcome per action; record every resulting link in the manifest."""
+    records: list[record_links.LinkRecord] = []
+    layer_name = _get_layer_name(script_name)
+    for action in plan:
+        with log_messages.timed_event(
+            layer=layer_name,
+            action="symlink",
+            source=action.source.path,
+            target=action.target.path,
+        ) as event:
+            event.outcome = _format_outcome(
+                outcome=action.kind.name.lower(),
+                dry_run=dry_run,
             )
-        except Exception as e:
-            ## broken or unresolvable symlink
-            log_messages.log_message(
-                script_name=script_name,
-                message=f"Warning: failed to resolve symlink {target_path}: {e}",
-            )
-        if dry_run:
-            log_messages.log_message(
-                script_name=script_name,
-                message=f"[dry-run] Would remove symlink: {target_path}",
-            )
-        else:
-            target_path.unlink()
-            log_messages.log_message(
+            record = _apply_link_action(
+                action=action,
                 script_name=script_name,
-                message=f"Removed symlink: {target_path}",
+                dry_run=dry_run,
             )
-        return None
-    ## for real files/dirs, rename in place
-    backup_path = _rename_with_timestamp(
-        target_path=target_path,
+        if record is not None:
+            records.append(record)
+    if not dry_run:
+        record_links.update_manifest(added=records)
+
+
+def create_symlinks(
+    *,
+    links: list[LinkRequest],
+    script_name: str,
+    dry_run: bool = False,
+) -> None:
+    """Plan and apply `links` in one step; planning happens now, so earlier actions are already visible."""
+    apply_link_plan(
+        plan=plan_symlinks(links=links),
         script_name=script_name,
         dry_run=dry_run,
     )
-    if backup_path:
-        log_messages.log_message(
-            script_name=script_name,
-            message=log_messages.format_dry_run(
-                message=f"{target_path} -> {backup_path}",
-                dry_run=dry_run,
-            ),
-        )
-    return backup_path
 
 
-def create_symlink(
+def remove_symlinks(
     *,
-    source_path: Path,
-    target_path: Path,
+    target_paths: list[Path],
     script_name: str,
     dry_run: bool = False,
 ) -> None:
-    """
-  Create a symlink from target_path to source_path.
-
-  Handle existing files by checking correctness, backing up if needed, and logging all actions.
-  """
-    ## source does not exist
-    if not source_path.exists():
-        log_messages.log_message(
-            script_name=script_name,
-            message=f"Skipping. {source_path} does not exist.",
-        )
-        return
-    ## target does not exist
-    if _path_is_missing(target_path):
-        _make_symlink(
-            source_path=source_path,
+    """Remove the symlinks among `target_paths` and drop all of them from the manifest in one write."""
+    for target_path in dict.fromkeys(target_paths):
+        remove_symlink(
             target_path=target_path,
             script_name=script_name,
             dry_run=dry_run,
         )
-        return
-    ## target is already correctly linked to source
-    if _already_linked_correctly(target_path=target_path, source_path=source_path):
-        log_messages.log_message(
-            script_name=script_name,
-            message=log_messages.format_dry_run(
-                message=f"Already correctly linked: {target_path}",
-                dry_run=dry_run,
-            ),
-        )
-        return
-    ## target points to something else
-    if _symlink_is_broken(target_path):
-        log_messages.log_message(
-            script_name=script_name,
-            message=f"Skipping. {target_path} is a broken symlink.",
-        )
-        return
-    ## check types match before replacing
-    if not _types_match(source_path=source_path, target_path=target_path):
-        log_messages.log_message(
-            script_name=script_name,
-            message=f"Skipping due to a type mismatch. {target_path} is {_get_path_type(target_path)}, "
-            f"but source is {_get_path_type(source_path)}.",
-        )
-        return
-    ## back up and replace
-    backup_file(
-        target_path=target_path,
-        script_name=script_name,
-        dry_run=dry_run,
-    )
-    _make_symlink(
-        source_path=source_path,
-        target_path=target_path,
-        script_name=script_name,
-        dry_run=dry_run,
-    )
+    if not dry_run:
+        record_links.update_manifest(removed=target_paths)
 
 
 def remove_symlink(
@@ -220,7 +359,12 @@ def remove_symlink(
             message=f"[dry-run] Would remove symlink: {target_path}",
         )
     else:
-        target_path.unlink()
+        with log_messages.timed_event(
+            layer=_get_layer_name(script_name),
+            action="unlink",
+            target=target_path,
+        ):
+            target_path.unlink()
         log_messages.log_message(
             script_name=script_name,
             message=f"Removed symlink: {target_path}",
@@ -231,20 +375,158 @@ def remove_symlink(
 ##
 
 
+def _get_layer_name(
+    script_name: str,
+) -> str:
+    ## `shell.py` -> `shell`, matching the layer prefix of scheduler action names
+    return Path(script_name).stem
+
+
+def _format_outcome(
+    *,
+    outcome: str,
+    dry_run: bool,
+) -> str:
+    if dry_run:
+        return f"{outcome} (dry-run)"
+    return outcome
+
+
+def _classify_link(
+    *,
+    source: PathSnapshot,
+    target: PathSnapshot,
+) -> LinkActionKind:
+    if not source.exists:
+        return LinkActionKind.SKIP_MISSING_SOURCE
+    if target.is_missing:
+        return LinkActionKind.LINK
+    if target.is_symlink and target.identity == source.identity:
+        return LinkActionKind.SKIP_ALREADY_LINKED
+    if target.is_broken_symlink:
+        return LinkActionKind.SKIP_BROKEN_SYMLINK
+    if not _types_match(source=source, target=target):
+        return LinkActionKind.SKIP_TYPE_MISMATCH
+    return LinkActionKind.BACKUP_AND_RELINK
+
+
+def _apply_link_action(
+    *,
+    action: LinkAction,
+    script_name: str,
+    dry_run: bool,
+) -> record_links.LinkRecord | None:
+    source_path = action.source.path
+    target_path = action.target.path
+    match action.kind:
+        case LinkActionKind.SKIP_MISSING_SOURCE:
+            log_messages.log_message(
+                script_name=script_name,
+                message=f"Skipping. {source_path} does not exist.",
+            )
+        case LinkActionKind.SKIP_ALREADY_LINKED:
+            log_messages.log_message(
+                script_name=script_name,
+                message=log_messages.format_dry_run(
+                    message=f"Already correctly linked: {target_path}",
+                    dry_run=dry_run,
+                ),
+            )
+            return record_links.create_record(
+                layer=script_name,
+                source_path=source_path,
+                target_path=target_path,
+                lstat_result=action.target.lstat_result,
+            )
+        case LinkActionKind.SKIP_BROKEN_SYMLINK:
+            log_messages.log_message(
+                script_name=script_name,
+                message=f"Skipping. {target_path} is a broken symlink.",
+            )
+        case LinkActionKind.SKIP_TYPE_MISMATCH:
+            log_messages.log_message(
+                script_name=script_name,
+                message=f"Skipping due to a type mismatch. {target_path} is {action.target.path_type}, "
+                f"but source is {action.source.path_type}.",
+            )
+        case LinkActionKind.LINK | LinkActionKind.BACKUP_AND_RELINK:
+            if action.kind == LinkActionKind.BACKUP_AND_RELINK:
+                _backup_snapshot(
+                    target=action.target,
+                    script_name=script_name,
+                    dry_run=dry_run,
+                )
+            _make_symlink(
+                source_path=source_path,
+                target_path=target_path,
+                script_name=script_name,
+                dry_run=dry_run,
+            )
+            if dry_run:
+                return None
+            return record_links.create_record(
+                layer=script_name,
+                source_path=source_path,
+                target_path=target_path,
+            )
+    return None
+
+
+def _backup_snapshot(
+    *,
+    target: PathSnapshot,
+    script_name: str,
+    dry_run: bool,
+) -> Path | None:
+    target_path = target.path
+    ## handle symbolic links separately
+    if target.is_symlink:
+        log_messages.log_message(
+            script_name=script_name,
+            message=log_messages.format_dry_run(
+                message=f"{target_path} (symlink) -> {target.link_value}",
+                dry_run=dry_run,
+            ),
+        )
+        if dry_run:
+            log_messages.log_message(
+                script_name=script_name,
+                message=f"[dry-run] Would remove symlink: {target_path}",
+            )
+        else:
+            target_path.unlink()
+            log_messages.log_message(
+                script_name=script_name,
+                message=f"Removed symlink: {target_path}",
+            )
+        return None
+    ## for real files/dirs, rename in place
+    backup_path = _rename_with_timestamp(
+        target_path=target_path,
+        script_name=script_name,
+        dry_run=dry_run,
+    )
+    log_messages.log_message(
+        script_name=script_name,
+        message=log_messages.format_dry_run(
+            message=f"{target_path} -> {backup_path}",
+            dry_run=dry_run,
+        ),
+    )
+    return backup_path
+
+
 def _rename_with_timestamp(
     *,
     target_path: Path,
     script_name: str,
     dry_run: bool = False,
-) -> Path | None:
+) -> Path:
     """
-  Rename a file or directory in place by appending a timestamp.
+  Rename an existing file or directory in place by appending a timestamp.
 
-  Return the new backup path if the rename was performed, otherwise return None.
+  Return the new backup path.
   """
-    ## skip if nothing exists at the path (incl. broken symlinks)
-    if not target_path.exists() and not target_path.is_symlink():
-        return None
     ## generate a timestamped backup name
     timestamp = log_messages.get_timestamp().replace(" ", ".")
     backup_path = target_path.with_stem(f"{target_path.stem}.{timestamp}")
@@ -262,39 +544,6 @@ def _rename_with_timestamp(
     return backup_path
 
 
-def _path_is_missing(
-    path: Path,
-) -> bool:
-    """
-  Return True if the path does not exist and is not a symlink.
-  """
-    return not path.exists() and not path.is_symlink()
-
-
-def _symlink_is_broken(
-    path: Path,
-) -> bool:
-    """
-  Return True if the path is a symlink but its target does not exist.
-  """
-    return path.is_symlink() and not path.exists()
-
-
-def _get_path_type(
-    path: Path,
-) -> str:
-    """
-  Return a description of the path type: file, dir, symlink, broken symlink, or unknown.
-  """
-    if path.is_dir():
-        return "dir"
-    elif path.is_file():
-        return "file"
-    elif path.is_symlink():
-        return "broken symlink" if not path.exists() else "symlink"
-    return "unknown"
-
-
 def _make_symlink(
     *,
     source_path: Path,
@@ -318,31 +567,17 @@ def _make_symlink(
         )
 
 
-def _already_linked_correctly(
-    *,
-    target_path: Path,
-    source_path: Path,
-) -> bool:
-    """
-  Check if the target is a symlink that points to the given source path.
-  """
-    try:
-        return target_path.is_symlink() and (target_path.resolve() == source_path.resolve())
-    except Exception:
-        return False
-
-
 def _types_match(
     *,
-    source_path: Path,
-    target_path: Path,
+    source: PathSnapshot,
+    target: PathSnapshot,
 ) -> bool:
     """
   Check whether both paths point to the same type.
   """
-    if source_path.is_file() and target_path.is_file():
+    if source.is_file and target.is_file:
         return True
-    if source_path.is_dir() and target_path.is_dir():
+    if source.is_dir and target.is_dir:
         return True
     return False
 
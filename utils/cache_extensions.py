@@ -0,0 +1,210 @@
+## { MODULE
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+from typing import cast
+import zipfile
+
+## local
+from utils import write_files
+
+##
+## === MODULE CONFIG
+##
+
+VSIX_CACHE_DIR = Path(
+    os.environ.get("DOTFILES_VSIX_CACHE") or
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "dotfiles" / "vsix",
+)
+MARKETPLACE_URL = (
+    "https://marketplace.visualstudio.com/_apis/public/gallery/publishers/{publisher}/vsextensions/{name}/"
+    "{version}/vspackage"
+)
+DOWNLOAD_TIMEOUT_SECONDS = 60
+
+_index_lock = threading.Lock()
+
+##
+## === CACHE FUNCTIONS
+##
+
+
+def split_extension_spec(
+    extension_spec: str,
+) -> tuple[str, str | None]:
+    """Split `publisher.name@version` into the lower-cased id and the version, which may be `None`."""
+    extension_id, _, version = extension_spec.strip().partition("@")
+    return extension_id.lower(), version or None
+
+
+def get_cached_vsix(
+    *,
+    extension_spec: str,
+    cache_dir: Path = VSIX_CACHE_DIR,
+) -> Path | None:
+    """
+  Return the cached VSIX for `publisher.name@version`, or for the newest cached version of `publisher.name`.
+
+  The blob is re-hashed before it is returned, so a corrupted cache entry is never installed.
+  """
+    extension_id, version = split_extension_spec(extension_spec)
+    cached_versions = _load_index(cache_dir).get(extension_id)
+    if not cached_versions:
+        return None
+    digest = cached_versions.get(version or max(cached_versions, key=_get_version_key))
+    if digest is None:
+        return None
+    blob_path = _get_blob_path(
+        cache_dir=cache_dir,
+        digest=digest,
+    )
+    try:
+        if _hash_file(blob_path) != digest:
+            return None
+    except FileNotFoundError:
+        return None
+    return blob_path
+
+
+def add_vsix(
+    vsix_path: Path,
+    *,
+    cache_dir: Path = VSIX_CACHE_DIR,
+) -> tuple[str, str]:
+    """
+  Store a VSIX under its content hash and index it by the id and version in its `package.json`.
+
+  Return `(extension id, version)`. Adding the same file twice stores it once.
+  """
+    extension_id, version = read_vsix_identity(vsix_path)
+    digest = _hash_file(vsix_path)
+    blob_path = _get_blob_path(
+        cache_dir=cache_dir,
+        digest=digest,
+    )
+    if not blob_path.exists():
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        ## a unique temp name, so concurrent adds of the same VSIX never write into one file
+        file_descriptor, temp_name = tempfile.mkstemp(
+            dir=blob_path.parent,
+            prefix=f".{blob_path.name}.",
+            suffix=".tmp",
+        )
+        try:
+            with os.fdopen(file_descriptor, "wb") as temp_file, open(vsix_path, "rb") as vsix_file:
+                shutil.copyfileobj(vsix_file, temp_file)
+            ## `mkstemp` creates 0600, which would hide a cache shared across accounts from everyone else
+            os.chmod(temp_name, write_files.DEFAULT_FILE_MODE)
+            os.replace(temp_name, blob_path)
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
+    with _index_lock:
+        index = _load_index(cache_dir)
+        index.setdefault(extension_id, {})[version] = digest
+        write_files.write_file_atomically(
+            cache_dir / "index.json",
+            content=json.dumps(index, indent=2, sort_keys=True),
+        )
+    return extension_id, version
+
+
+def download_vsix(
+    *,
+    extension_spec: str,
+    cache_dir: Path = VSIX_CACHE_DIR,
+) -> tuple[str, str]:
+    """Download one extension from the marketplace into the cache; return `(extension id, version)`."""
+    ## imported here, since every other cache lookup is offline and `urllib.request` is slow to import
+    from http.client import HTTPResponse
+    import urllib.request
+    extension_id, version = split_extension_spec(extension_spec)
+    publisher, _, name = extension_id.partition(".")
+    if not publisher or not name:
+        raise ValueError(f"expected an extension id like `publisher.name`; got `{extension_spec}`.")
+    url = MARKETPLACE_URL.format(
+        publisher=publisher,
+        name=name,
+        version=version or "latest",
+    )
+    request = urllib.request.Request(
+        url,
+        headers={"Accept-Encoding": "gzip"},
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        download_path = Path(temp_dir) / f"{extension_id}.vsix"
+        with cast(HTTPResponse, urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT_SECONDS)) as response:
+            payload = response.read()
+            if response.headers.get("Content-Encoding") == "gzip":
+                payload = gzip.decompress(payload)
+        download_path.write_bytes(payload)
+        return add_vsix(
+            download_path,
+            cache_dir=cache_dir,
+        )
+
+
+def read_vsix_identity(
+    vsix_path: Path,
+) -> tuple[str, str]:
+    """Return the lower-cased `publisher.name` id and the version declared in a VSIX's `package.json`."""
+    try:
+        with zipfile.ZipFile(vsix_path) as vsix_archive:
+            manifest = cast(object, json.loads(vsix_archive.read("extension/package.json")))
+    except (zipfile.BadZipFile, KeyError, ValueError) as error:
+        raise ValueError(f"{vsix_path} is not a VSIX with an `extension/package.json`.") from error
+    if not isinstance(manifest, dict):
+        raise ValueError(f"{vsix_path} has a malformed `extension/package.json`.")
+    manifest = cast(dict[str, object], manifest)
+    publisher, name, version = manifest.get("publisher"), manifest.get("name"), manifest.get("version")
+    if not (isinstance(publisher, str) and isinstance(name, str) and isinstance(version, str)):
+        raise ValueError(f"{vsix_path} is missing `publisher`, `name` or `version` in its `package.json`.")
+    return f"{publisher}.{name}".lower(), version
+
+
+def _load_index(
+    cache_dir: Path,
+) -> dict[str, dict[str, str]]:
+    """Return `{extension id: {version: sha256 of the VSIX}}`."""
+    try:
+        return cast(
+            dict[str, dict[str, str]],
+            json.loads((cache_dir / "index.json").read_text(encoding="utf-8")),
+        )
+    except (OSError, ValueError):
+        return {}
+
+
+def _get_blob_path(
+    *,
+    cache_dir: Path,
+    digest: str,
+) -> Path:
+    return cache_dir / "blobs" / digest[:2] / f"{digest}.vsix"
+
+
+def _hash_file(
+    file_path: Path,
+) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _get_version_key(
+    version: str,
+) -> tuple[int, ...]:
+    ## numeric comparison so `1.10.0` sorts after `1.9.0`; non-numeric parts sort first
+    return tuple(int(part) if part.isdigit() else -1 for part in version.split("."))
+
+## } MODULE
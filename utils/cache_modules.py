@@ -0,0 +1,126 @@
+## { MODULE
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+from collections.abc import Callable
+import hashlib
+import marshal
+import os
+from pathlib import Path
+import threading
+import time
+from typing import cast
+
+## local
+from utils import record_links, write_files
+
+##
+## === MODULE CONFIG
+##
+
+MODULE_CACHE_FILE = record_links.STATE_DIR / "parsed-modules.marshal"
+MODULE_CACHE_VERSION = 1
+## a module edited within this window of being cached could keep its size and mtime; verify it by hash next time
+_RACY_WINDOW_NS = 2_000_000_000
+
+_CacheEntry = tuple[int, int, bytes, object]  # (size, mtime_ns, sha256 digest, parsed object)
+
+_cache_lock = threading.Lock()  # editors merge their modules from scheduler worker threads
+_cache_entries: dict[str, _CacheEntry] | None = None
+_is_cache_dirty = False
+
+##
+## === CACHE FUNCTIONS
+##
+
+
+def load_module(
+    path: Path,
+    *,
+    parse: Callable[[str], object],
+) -> object:
+    """
+  Return the parsed contents of `path`, parsing it with `parse` only when it changed since it was cached.
+
+  An unchanged module costs one `os.stat`. A module whose size or mtime moved is read and hashed, and only
+  re-parsed when its content hash differs. Cached objects are shared; callers must not mutate them.
+  """
+    stat_result = os.stat(path)
+    cache_key = str(path)
+    with _cache_lock:
+        cache_entries = _get_cache_entries()
+        cached_entry = cache_entries.get(cache_key)
+    if cached_entry is not None:
+        cached_size, cached_mtime_ns, cached_digest, cached_object = cached_entry
+        if (cached_size, cached_mtime_ns) == (stat_result.st_size, stat_result.st_mtime_ns):
+            return cached_object
+    else:
+        cached_digest, cached_object = b"", None
+    raw_content = path.read_bytes()
+    digest = hashlib.sha256(raw_content).digest()
+    parsed_object = cached_object if digest == cached_digest else parse(raw_content.decode("utf-8"))
+    recorded_mtime_ns = stat_result.st_mtime_ns
+    if time.time_ns() - recorded_mtime_ns < _RACY_WINDOW_NS:
+        recorded_mtime_ns = 0
+    _store_entry(
+        cache_key=cache_key,
+        cache_entry=(stat_result.st_size, recorded_mtime_ns, digest, parsed_object),
+    )
+    return parsed_object
+
+
+def save_module_cache(
+    *,
+    cache_file: Path = MODULE_CACHE_FILE,
+) -> None:
+    """Write the cache back to disk if any module was parsed or re-hashed since it was loaded."""
+    global _is_cache_dirty
+    with _cache_lock:
+        if not _is_cache_dirty or _cache_entries is None:
+            return
+        ## written under the lock so a concurrent save can never replace a newer cache with an older one
+        write_files.write_file_atomically(
+            cache_file,
+            content=marshal.dumps({"version": MODULE_CACHE_VERSION, "entries": _cache_entries}),
+        )
+        _is_cache_dirty = False
+
+
+def _get_cache_entries() -> dict[str, _CacheEntry]:
+    global _cache_entries
+    if _cache_entries is None:
+        _cache_entries = _read_cache_file(MODULE_CACHE_FILE)
+    return _cache_entries
+
+
+def _read_cache_file(
+    cache_file: Path,
+) -> dict[str, _CacheEntry]:
+    try:
+        cache_payload = cast(object, marshal.loads(cache_file.read_bytes()))
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+    ## anything else was written by a different cache version; start over
+    if not isinstance(cache_payload, dict):
+        return {}
+    cache_payload = cast(dict[str, object], cache_payload)
+    cache_entries = cache_payload.get("entries")
+    if cache_payload.get("version") != MODULE_CACHE_VERSION or not isinstance(cache_entries, dict):
+        return {}
+    return cast(dict[str, _CacheEntry], cache_entries)
+
+
+def _store_entry(
+    *,
+    cache_key: str,
+    cache_entry: _CacheEntry,
+) -> None:
+    global _is_cache_dirty
+    with _cache_lock:
+        _get_cache_entries()[cache_key] = cache_entry
+        _is_cache_dirty = True
+
+## } MODULE
@@ -0,0 +1,431 @@
+## { MODULE
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import functools
+import hashlib
+import os
+from pathlib import Path
+import re
+import shutil
+import signal
+import subprocess
+import time
+from typing import cast
+
+## local
+from utils import apply_shell_actions, log_messages
+
+##
+## === MODULE CONFIG
+##
+
+MIRROR_CACHE_DIR = Path(
+    os.environ.get("DOTFILES_GIT_MIRRORS") or
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "dotfiles" / "git-mirrors",
+)
+## a mirror fetched more recently than this is cloned from as-is, without touching the network
+MIRROR_REFRESH_SECONDS = 24 * 60 * 60
+GIT_TIMEOUT_SECONDS = 300
+UPDATE_TIMEOUT_SECONDS = 120
+UPDATE_MAX_WORKERS = 8
+
+
+@dataclass
+class RepoConfig:
+    """
+  One git checkout managed by a setup layer.
+
+  Fields
+  ---
+  - `commit`:
+      Pin the checkout to this commit (e.g. from a plugin lockfile); `None` clones the default branch shallowly.
+  """
+
+    name: str
+    url: str
+    output: Path
+    commit: str | None = None
+
+
+@dataclass
+class UpdateResult:
+    """
+  Outcome of fast-forwarding one checkout.
+
+  Fields
+  ---
+  - `old_revision`, `new_revision`:
+      `HEAD` before and after the update; `None` when the checkout could not be read.
+
+  - `error`:
+      Why the update failed, or `None` on success (including when there was nothing new).
+  """
+
+    repo: RepoConfig
+    old_revision: str | None = None
+    new_revision: str | None = None
+    error: str | None = None
+
+
+##
+## === CLONE FUNCTIONS
+##
+
+
+def clone_repo(
+    *,
+    repo: RepoConfig,
+    script_name: str,
+    dry_run: bool,
+    cache_dir: Path = MIRROR_CACHE_DIR,
+) -> bool:
+    """
+  Shallow-clone `repo` into `repo.output` from a local bare mirror of `repo.url`, creating the mirror if needed.
+
+  The clone's `origin` points back at `repo.url`, so later pulls go to the real remote. When the mirror cannot be
+  created (e.g. offline with an empty cache), the clone falls back to `repo.url` directly. Pinned repos are
+  handled by `clone_pinned_repo`.
+  """
+    if repo.commit is not None:
+        return clone_pinned_repo(
+            repo=repo,
+            commit=repo.commit,
+            script_name=script_name,
+            dry_run=dry_run,
+            cache_dir=cache_dir,
+        )
+    if repo.output.exists():
+        log_messages.log_message(
+            script_name=script_name,
+            message=log_messages.format_dry_run(
+                message=f"{repo.name} already exists under: {repo.output}",
+                dry_run=dry_run,
+            ),
+        )
+        return True
+    mirror_path = get_mirror_path(
+        url=repo.url,
+        cache_dir=cache_dir,
+    )
+    if dry_run:
+        log_messages.log_message(
+            script_name=script_name,
+            message=f"[dry-run] Would run: clone {repo.name} (shallow) under {repo.output} via {mirror_path}",
+        )
+        return True
+    if not update_mirror(
+            url=repo.url,
+            mirror_path=mirror_path,
+            script_name=script_name,
+    ):
+        return apply_shell_actions.run_command(
+            args=["git", "clone", "--depth", "1", repo.url,
+                  str(repo.output)],
+            script_name=script_name,
+            description=f"clone {repo.name} (shallow) under {repo.output}",
+        )
+    ## `--depth` is ignored for plain local paths, so the mirror is addressed as a `file://` url
+    if not apply_shell_actions.run_command(
+            args=["git", "clone", "--depth", "1", mirror_path.as_uri(),
+                  str(repo.output)],
+            script_name=script_name,
+            description=f"clone {repo.name} (shallow) under {repo.output} from the local mirror",
+    ):
+        return False
+    return apply_shell_actions.run_command(
+        args=["git", "-C", str(repo.output), "remote", "set-url", "origin", repo.url],
+        script_name=script_name,
+        description=f"point {repo.name} at {repo.url}",
+    )
+
+
+def clone_pinned_repo(
+    *,
+    repo: RepoConfig,
+    commit: str,
+    script_name: str,
+    dry_run: bool,
+    cache_dir: Path = MIRROR_CACHE_DIR,
+) -> bool:
+    """
+  Make `repo.output` a checkout of `commit`: clone it if missing, or fetch and move an existing checkout.
+
+  New clones come from the local mirror (hard-linked, so no network) when the mirror has the commit; the mirror
+  is fetched once if it does not. Without a mirror, `repo.url` is cloned blob-less. Checkouts end on a detached
+  `HEAD`, as lockfile restores leave them.
+  """
+    short_commit = commit[:12]
+    if (repo.output / ".git").exists():
+        if _read_revision(repo.output) == commit:
+            log_messages.log_message(
+                script_name=script_name,
+                message=log_messages.format_dry_run(
+                    message=f"{repo.name} is already at {short_commit}",
+                    dry_run=dry_run,
+                ),
+            )
+            return True
+        if not dry_run and not _has_commit(
+                git_args=["-C", str(repo.output)],
+                commit=commit,
+        ):
+            if not apply_shell_actions.run_command(
+                    args=["git", "-C", str(repo.output), "fetch", "--quiet", "origin"],
+                    script_name=script_name,
+                    description=f"fetch {repo.name}",
+            ):
+                return False
+        return apply_shell_actions.run_command(
+            args=["git", "-C", str(repo.output), "checkout", "--quiet", commit],
+            script_name=script_name,
+            description=f"check out {repo.name} at {short_commit}",
+            dry_run=dry_run,
+        )
+    if repo.output.exists():
+        log_messages.log_message(
+            script_name=script_name,
+            message=log_messages.format_dry_run(
+                message=f"{repo.name} exists under {repo.output} but is not a git checkout; leaving it alone.",
+                dry_run=dry_run,
+            ),
+        )
+        return False
+    mirror_path = get_mirror_path(
+        url=repo.url,
+        cache_dir=cache_dir,
+    )
+    if dry_run:
+        log_messages.log_message(
+            script_name=script_name,
+            message=f"[dry-run] Would run: clone {repo.name} at {short_commit} under {repo.output} via {mirror_path}",
+        )
+        return True
+    clone_args = ["git", "clone", "--quiet", "--no-checkout", "--filter=blob:none", repo.url, str(repo.output)]
+    is_from_mirror = False
+    if update_mirror(
+            url=repo.url,
+            mirror_path=mirror_path,
+            script_name=script_name,
+    ):
+        mirror_args = ["--git-dir", str(mirror_path)]
+        ## a commit pinned after the mirror's last refresh needs one more fetch
+        is_from_mirror = _has_commit(git_args=mirror_args, commit=commit) or (
+            _fetch_mirror(mirror_path) and _has_commit(git_args=mirror_args, commit=commit)
+        )
+        if is_from_mirror:
+            ## a plain local path clones by hard-linking objects, so the whole history costs no copying
+            clone_args = ["git", "clone", "--quiet", "--no-checkout", str(mirror_path), str(repo.output)]
+    if not apply_shell_actions.run_command(
+            args=clone_args,
+            script_name=script_name,
+            description=f"clone {repo.name} under {repo.output}" + (" from the local mirror" if is_from_mirror else ""),
+    ):
+        return False
+    if not apply_shell_actions.run_command(
+            args=["git", "-C", str(repo.output), "checkout", "--quiet", commit],
+            script_name=script_name,
+            description=f"check out {repo.name} at {short_commit}",
+    ):
+        return False
+    if not is_from_mirror:
+        return True
+    return apply_shell_actions.run_command(
+        args=["git", "-C", str(repo.output), "remote", "set-url", "origin", repo.url],
+        script_name=script_name,
+        description=f"point {repo.name} at {repo.url}",
+    )
+
+
+def get_mirror_path(
+    *,
+    url: str,
+    cache_dir: Path = MIRROR_CACHE_DIR,
+) -> Path:
+    """Return where the bare mirror of `url` lives; the hash keeps same-named repos from different hosts apart."""
+    repo_name = re.sub(r"[^A-Za-z0-9._-]", "-", url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git"))
+    url_digest = hashlib.sha256(url.encode()).hexdigest()[:12]
+    return cache_dir / f"{repo_name}-{url_digest}.git"
+
+
+def update_mirror(
+    *,
+    url: str,
+    mirror_path: Path,
+    script_name: str,
+) -> bool:
+    """
+  Create the bare mirror of `url`, or refresh it once it is older than `MIRROR_REFRESH_SECONDS`.
+
+  Return `True` iff a mirror is usable afterwards; a failed refresh keeps the stale mirror usable.
+  """
+    if mirror_path.exists():
+        if time.time() - _get_last_fetch_time(mirror_path) < MIRROR_REFRESH_SECONDS:
+            return True
+        if not _fetch_mirror(mirror_path):
+            log_messages.log_message(
+                script_name=script_name,
+                message=f"Could not refresh the mirror of {url}; cloning from the cached copy.",
+            )
+        return True
+    try:
+        mirror_path.parent.mkdir(parents=True, exist_ok=True)
+    except OSError as error:
+        log_messages.log_message(
+            script_name=script_name,
+            message=f"Could not create the mirror cache ({error}); cloning {url} directly.",
+        )
+        return False
+    ## built beside its final path and renamed into place, so an interrupted clone never leaves a broken mirror
+    temp_path = mirror_path.with_name(f".{mirror_path.name}.{os.getpid()}.tmp")
+    log_messages.log_message(
+        script_name=script_name,
+        message=f"Creating a local mirror of {url} under: {mirror_path}",
+    )
+    if _run_git(["git", "clone", "--mirror", "--quiet", url, str(temp_path)]) is None:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        log_messages.log_message(
+            script_name=script_name,
+            message=f"Could not mirror {url}; cloning it directly.",
+        )
+        return False
+    (temp_path / "FETCH_HEAD").touch()
+    try:
+        temp_path.rename(mirror_path)
+    except OSError:
+        ## another process finished the same mirror first
+        shutil.rmtree(temp_path, ignore_errors=True)
+    return True
+
+
+def update_repos(
+    *,
+    repos: list[RepoConfig],
+    max_workers: int,
+    timeout_seconds: float = UPDATE_TIMEOUT_SECONDS,
+) -> list[UpdateResult]:
+    """Fast-forward every checkout concurrently; results keep the order of `repos`."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(
+            executor.map(
+                functools.partial(
+                    update_repo,
+                    timeout_seconds=timeout_seconds,
+                ),
+                repos,
+            ),
+        )
+
+
+def update_repo(
+    repo: RepoConfig,
+    *,
+    timeout_seconds: float = UPDATE_TIMEOUT_SECONDS,
+) -> UpdateResult:
+    """
+  Fetch `repo.output` from its `origin` and fast-forward it, giving up after `timeout_seconds`.
+
+  Local commits or a diverged upstream are reported as an error rather than merged.
+  """
+    result = UpdateResult(repo=repo)
+    result.old_revision = _read_revision(repo.output)
+    if result.old_revision is None:
+        result.error = "not a git checkout"
+        return result
+    try:
+        completed = _run_git_process(
+            ["git", "-C", str(repo.output), "pull", "--ff-only", "--quiet"],
+            timeout_seconds=timeout_seconds,
+        )
+    except subprocess.TimeoutExpired:
+        result.error = f"timed out after {timeout_seconds:g}s"
+    except OSError as error:
+        result.error = str(error)
+    else:
+        error_lines = completed.stderr.strip().splitlines()
+        if completed.returncode != 0:
+            ## git's own diagnosis is on its `fatal:` line; hints and remote chatter surround it
+            fatal_lines = [line for line in error_lines if line.startswith("fatal:")]
+            result.error = (fatal_lines or error_lines or ["git pull failed"])[0]
+    result.new_revision = _read_revision(repo.output)
+    return result
+
+
+def _read_revision(
+    checkout_dir: Path,
+) -> str | None:
+    completed = _run_git(["git", "-C", str(checkout_dir), "rev-parse", "HEAD"])
+    return None if completed is None else completed.stdout.strip()
+
+
+def _fetch_mirror(
+    mirror_path: Path,
+) -> bool:
+    if _run_git(["git", "--git-dir", str(mirror_path), "fetch", "--prune", "--quiet"]) is None:
+        return False
+    ## a fetch with nothing new does not touch `FETCH_HEAD`, so the refresh is stamped explicitly
+    (mirror_path / "FETCH_HEAD").touch()
+    return True
+
+
+def _has_commit(
+    *,
+    git_args: list[str],
+    commit: str,
+) -> bool:
+    return _run_git(["git", *git_args, "cat-file", "-e", f"{commit}^{{commit}}"]) is not None
+
+
+def _get_last_fetch_time(
+    mirror_path: Path,
+) -> float:
+    try:
+        return (mirror_path / "FETCH_HEAD").stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _run_git(
+    args: list[str],
+) -> subprocess.CompletedProcess[str] | None:
+    ## mirror upkeep is best-effort: failures fall back to the network and are not reported as failed commands
+    try:
+        result = _run_git_process(
+            args,
+            timeout_seconds=GIT_TIMEOUT_SECONDS,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result if result.returncode == 0 else None
+
+
+def _run_git_process(
+    args: list[str],
+    *,
+    timeout_seconds: float,
+) -> subprocess.CompletedProcess[str]:
+    ## git hands network work to helper processes, so a timeout must kill the whole process group;
+    ## killing only `git` would leave the helpers holding the output pipes open
+    with subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+            start_new_session=True,
+    ) as process:
+        try:
+            stdout, stderr = process.communicate(timeout=timeout_seconds)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            raise
+    return subprocess.CompletedProcess(args, cast(int, process.returncode), stdout, stderr)
+
+## } MODULE
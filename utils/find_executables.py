@@ -0,0 +1,138 @@
+## { MODULE
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+import marshal
+import os
+from pathlib import Path
+import threading
+import time
+from typing import cast
+
+## local
+from utils import record_links, write_files
+
+##
+## === MODULE CONFIG
+##
+
+PATH_INDEX_FILE = record_links.STATE_DIR / "path-index.marshal"
+PATH_INDEX_VERSION = 1
+## reusing directory listings across runs is opt-in: a directory's mtime only moves when entries are added or removed
+PERSIST_PATH_INDEX = os.environ.get("DOTFILES_PERSIST_PATH_INDEX") == "1"
+## a directory changed within this window of being listed could change again without moving its mtime
+_RACY_WINDOW_NS = 2_000_000_000
+
+_DirListing = tuple[int, list[str]]  # (directory mtime_ns, entry names)
+
+_index_lock = threading.Lock()  # layers look commands up from scheduler worker threads
+_command_dirs: dict[str, list[str]] | None = None
+
+##
+## === LOOKUP FUNCTIONS
+##
+
+
+def find_executable(
+    command: str,
+) -> str | None:
+    """
+  Return the path of `command` the way `shutil.which` would, from an index of every `$PATH` directory.
+
+  The index is built on first use with one `os.scandir` per directory, so each lookup is a dict hit plus one
+  `os.access` on the match. Commands given as paths are checked directly.
+  """
+    if os.sep in command:
+        return command if _is_executable(command) else None
+    with _index_lock:
+        command_dirs = _get_command_dirs()
+    ## a name can be listed in several directories; the first executable one wins, as with `$PATH` itself
+    for directory in command_dirs.get(command, []):
+        command_path = os.path.join(directory, command)
+        if _is_executable(command_path):
+            return command_path
+    return None
+
+
+def _get_command_dirs() -> dict[str, list[str]]:
+    global _command_dirs
+    if _command_dirs is None:
+        _command_dirs = _build_command_dirs(
+            path_dirs=list(dict.fromkeys(os.environ.get("PATH", os.defpath).split(os.pathsep))),
+            persist=PERSIST_PATH_INDEX,
+        )
+    return _command_dirs
+
+
+def _build_command_dirs(
+    *,
+    path_dirs: list[str],
+    persist: bool,
+    index_file: Path = PATH_INDEX_FILE,
+) -> dict[str, list[str]]:
+    saved_listings = _read_index_file(index_file) if persist else {}
+    listings: dict[str, _DirListing] = {}
+    is_index_stale = False
+    for directory in path_dirs:
+        if not directory:
+            continue
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            continue
+        saved_listing = saved_listings.get(directory)
+        if saved_listing is not None and saved_listing[0] == mtime_ns:
+            listings[directory] = saved_listing
+            continue
+        try:
+            with os.scandir(directory) as scanned_entries:
+                ## `d_type` alone skips directories without a `stat` per entry; symlinks and the executable bit
+                ## are resolved per lookup instead
+                entry_names = [entry.name for entry in scanned_entries if not entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            continue
+        if time.time_ns() - mtime_ns < _RACY_WINDOW_NS:
+            mtime_ns = 0
+        listings[directory] = (mtime_ns, entry_names)
+        is_index_stale = True
+    if persist and is_index_stale:
+        try:
+            write_files.write_file_atomically(
+                index_file,
+                content=marshal.dumps({"version": PATH_INDEX_VERSION, "listings": listings}),
+            )
+        except OSError:
+            ## the index only saves time; an unwritable state dir must not fail detection
+            pass
+    command_dirs: dict[str, list[str]] = {}
+    for directory, (_, entry_names) in listings.items():
+        for entry_name in entry_names:
+            command_dirs.setdefault(entry_name, []).append(directory)
+    return command_dirs
+
+
+def _read_index_file(
+    index_file: Path,
+) -> dict[str, _DirListing]:
+    try:
+        index_payload = cast(object, marshal.loads(index_file.read_bytes()))
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+    if not isinstance(index_payload, dict):
+        return {}
+    index_payload = cast(dict[str, object], index_payload)
+    listings = index_payload.get("listings")
+    if index_payload.get("version") != PATH_INDEX_VERSION or not isinstance(listings, dict):
+        return {}
+    return cast(dict[str, _DirListing], listings)
+
+
+def _is_executable(
+    command_path: str,
+) -> bool:
+    return os.access(command_path, os.X_OK) and not os.path.isdir(command_path)
+
+## } MODULE
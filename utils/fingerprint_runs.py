@@ -0,0 +1,126 @@
+## { MODULE
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+from collections.abc import Iterator
+import hashlib
+import os
+from pathlib import Path
+import sys
+
+## local
+from utils import load_profiles, record_links, write_files
+
+##
+## === MODULE CONFIG
+##
+
+FINGERPRINT_FILE = record_links.STATE_DIR / "last-run.fingerprint"
+_SKIPPED_DIR_NAMES = {"__pycache__", "node_modules"}
+
+##
+## === FINGERPRINT FUNCTIONS
+##
+
+
+def compute_fingerprint(
+    *,
+    root_dir: Path = load_profiles.DOTFILES_DIR,
+    profile_path: Path = load_profiles.THIS_SYSTEM_PROFILE_PATH,
+) -> str:
+    """
+  Hash everything a full run depends on: the repo tree, `this-system.toml`, the recorded links, and the
+  directories tools and editors are detected in.
+
+  The repo tree is hashed from `os.scandir` metadata (path, size, mtime) rather than file contents, and each
+  recorded link contributes one `os.lstat`, so the cost is one syscall per repo entry and per link. Detection
+  contributes one `os.stat` per `$PATH` directory: installing or removing a command moves its directory's mtime, so
+  a tool installed after the last run is set up without `--force`.
+  """
+    digest = hashlib.sha256()
+    digest.update(str(Path.home()).encode())
+    for entry_line in _iter_tree_entries(
+            root_dir=root_dir,
+            directory=root_dir,
+    ):
+        digest.update(entry_line.encode())
+    try:
+        digest.update(profile_path.read_bytes())
+    except OSError:
+        digest.update(b"<no profile>")
+    for target_path, record in sorted(record_links.load_manifest().items()):
+        try:
+            lstat_result = os.lstat(target_path)
+            link_state = f"{lstat_result.st_ino}:{lstat_result.st_mtime_ns}"
+        except OSError:
+            link_state = "missing"
+        digest.update(f"{target_path}\0{record.source_path}\0{link_state}\n".encode())
+    for entry_line in _iter_detection_entries():
+        digest.update(entry_line.encode())
+    return digest.hexdigest()
+
+
+def fingerprint_matches(
+    fingerprint: str,
+    *,
+    fingerprint_file: Path = FINGERPRINT_FILE,
+) -> bool:
+    """Return `True` iff `fingerprint` equals the one saved by the last successful run."""
+    try:
+        return fingerprint_file.read_text(encoding="utf-8").strip() == fingerprint
+    except OSError:
+        return False
+
+
+def save_fingerprint(
+    fingerprint: str,
+    *,
+    fingerprint_file: Path = FINGERPRINT_FILE,
+) -> None:
+    """Save the fingerprint of a successful run."""
+    write_files.write_file_atomically(
+        fingerprint_file,
+        content=f"{fingerprint}\n",
+    )
+
+
+def _iter_detection_entries() -> Iterator[str]:
+    detection_dirs = list(dict.fromkeys(os.environ.get("PATH", os.defpath).split(os.pathsep)))
+    ## macOS apps are detected by their bundle in `/Applications` as well as by their command
+    if sys.platform == "darwin":
+        detection_dirs.append("/Applications")
+    for directory in detection_dirs:
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            mtime_ns = -1
+        yield f"{directory}\0{mtime_ns}\n"
+
+
+def _iter_tree_entries(
+    *,
+    root_dir: Path,
+    directory: Path,
+) -> Iterator[str]:
+    with os.scandir(directory) as scanned_entries:
+        entries = sorted(scanned_entries, key=lambda entry: entry.name)
+    ## nested checkouts (cloned plugins, Doom) change on their own and are not inputs to a run
+    if directory != root_dir and any(entry.name == ".git" for entry in entries):
+        return
+    for entry in entries:
+        if entry.name.startswith(".") or entry.name in _SKIPPED_DIR_NAMES:
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            yield from _iter_tree_entries(
+                root_dir=root_dir,
+                directory=Path(entry.path),
+            )
+            continue
+        entry_stat = entry.stat(follow_symlinks=False)
+        relative_name = os.path.relpath(entry.path, root_dir)
+        yield f"{relative_name}\0{entry_stat.st_size}\0{entry_stat.st_mtime_ns}\n"
+
+## } MODULE
@@ -33,6 +33,7 @@ class SystemProfile:
     extras: tuple[str, ...]
     link_rules: bool
     set_login_shell: bool
+    bundle_shell: bool
 
 ##
 ## === PROFILE HELPERS
@@ -98,6 +99,11 @@ def create_profile(
             key="set_login_shell",
             default=True,
         ),
+        bundle_shell=_get_bool(
+            raw_profile=raw_profile,
+            key="bundle_shell",
+            default=False,
+        ),
     )
 
 
@@ -5,24 +5,72 @@
 ##
 
 ## stdlib
+import atexit
+from collections.abc import Generator
+import contextlib
+from dataclasses import dataclass
 import datetime
+import enum
+import fcntl
+import gzip
+import json
+import os
 from pathlib import Path
-from typing import Callable
+import queue
+import shutil
+import socket
+import sys
+import threading
+import time
+from typing import BinaryIO, Callable, TypeAlias, cast
+
+##
+## === TYPE ALIASES
+##
+
+_LogEntry: TypeAlias = tuple[str, Path | None, bool]  # (entry text, file or `None`, whether to print it)
+_QueueItem: TypeAlias = list[_LogEntry] | threading.Event  # an event is a flush request
+
+
+class _Unset(enum.Enum):
+    UNSET = enum.auto()  # marks a `configure` argument the caller did not pass
 
 ##
 ## === MODULE CONFIG
 ##
 
 LOG_FILE = Path.home() / "dotfiles_log.txt"
+FLUSH_INTERVAL_SECONDS = 0.2
+FLUSH_SIZE_BYTES = 64 * 1024
+MAX_LOG_BYTES = 4 * 1024 * 1024
+MAX_LOG_AGE_DAYS = 30
+MAX_LOG_ARCHIVES = 8
+## a flush gives up after this long, so a stuck or dead writer can never hang the process
+FLUSH_TIMEOUT_SECONDS = 10.0
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+_HOST_NAME = socket.gethostname()
 _should_write_to_file = True  # dry-runs auto-disable this
+_events_file: Path | None = None  # structured events are only written when a sink is configured
+_thread_state = threading.local()
+_writer_lock = threading.Lock()
+_log_queue: queue.SimpleQueue[_QueueItem] = queue.SimpleQueue()
+_writer_thread: threading.Thread | None = None
+_open_log_files: dict[Path, BinaryIO] = {}
+_open_lock_files: dict[Path, BinaryIO] = {}  # shared locks that keep other processes from rotating open logs
+_failed_log_files: set[Path] = set()  # files whose write failure was already reported
+_run_id = f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"  # marks this process's entries in the log
 
 ##
 ## === LOG FUNCTIONS
 ##
 
 
+def get_run_id() -> str:
+    return _run_id
+
+
 def get_timestamp() -> str:
-    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
 
 
 def log_message(
@@ -31,23 +79,59 @@ def log_message(
     message: str,
     log_file: Path = LOG_FILE,
 ) -> None:
+    """
+  Queue one log entry for the background writer; never blocks on terminal or file I/O.
+
+  The writer keeps each log file open and prints and writes entries in batches, flushing once
+  `FLUSH_SIZE_BYTES` accumulate or `FLUSH_INTERVAL_SECONDS` pass, and on `flush()` or exit.
+  """
     ## get time
     timestamp = get_timestamp()
     log_entry = f"[{timestamp}] ({script_name}): {message}\n"
-    print(log_entry)
-    if not _should_write_to_file:
+    _add_entry((log_entry, log_file if _should_write_to_file else None, True))
+
+
+@contextlib.contextmanager
+def buffer_messages() -> Generator[None]:
+    """Hold this thread's log entries and emit them as one uninterrupted block on exit."""
+    buffered_entries: list[_LogEntry] = []
+    _thread_state.entries = buffered_entries
+    try:
+        yield
+    finally:
+        _thread_state.entries = None
+        if buffered_entries:
+            _enqueue(buffered_entries)
+
+
+def flush() -> None:
+    """
+  Block until every queued entry has been printed and written, or `FLUSH_TIMEOUT_SECONDS` pass.
+
+  Entries this thread holds in `buffer_messages` are emitted first, and later ones are buffered again.
+  """
+    buffered_entries = cast(list[_LogEntry] | None, getattr(_thread_state, "entries", None))
+    if buffered_entries:
+        _enqueue(list(buffered_entries))
+        buffered_entries.clear()
+    if _writer_thread is None or not _writer_thread.is_alive():
         return
-    log_file.parent.mkdir(parents=True, exist_ok=True)
-    with open(log_file, "a") as f:
-        f.write(log_entry)
+    flushed = threading.Event()
+    _log_queue.put(flushed)
+    if not flushed.wait(FLUSH_TIMEOUT_SECONDS):
+        _report_write_error(f"log writer did not flush within {FLUSH_TIMEOUT_SECONDS:g}s")
 
 
 def configure(
     *,
     write_to_file: bool,
+    events_file: Path | None | _Unset = _Unset.UNSET,
 ) -> None:
-    global _should_write_to_file
+    """Set where entries go; `events_file` keeps its current sink unless passed, since every layer calls this."""
+    global _should_write_to_file, _events_file
     _should_write_to_file = write_to_file
+    if events_file is not _Unset.UNSET:
+        _events_file = events_file
 
 
 def format_dry_run(
@@ -72,4 +156,335 @@ def make_logger(
         )
     return _log
 
+
+##
+## === STRUCTURED EVENTS
+##
+
+
+@dataclass
+class Event:
+    """
+  One timed action reported to the structured event sink.
+
+  Fields
+  ---
+  - `layer`:
+      Setup layer that owns the action, e.g. `shell` or `editors`.
+
+  - `action`:
+      What was attempted, e.g. `symlink`, `command`, or a scheduler action name.
+
+  - `outcome`:
+      Set by the caller before the block exits; an exception escaping the block records `error`.
+  """
+
+    layer: str
+    action: str
+    source: str | None = None
+    target: str | None = None
+    outcome: str = "ok"
+
+
+def events_enabled() -> bool:
+    return _events_file is not None
+
+
+@contextlib.contextmanager
+def timed_event(
+    *,
+    layer: str,
+    action: str,
+    source: Path | str | None = None,
+    target: Path | str | None = None,
+) -> Generator[Event]:
+    """
+  Time the enclosed block and append one JSON object describing it to the configured events file.
+
+  Each line carries `host`, `home`, `layer`, `action`, `source`, `target`, `outcome`, `start` (Unix seconds)
+  and `duration_us`, so event files from many machines can be concatenated and aggregated.
+  """
+    event = Event(
+        layer=layer,
+        action=action,
+        source=None if source is None else str(source),
+        target=None if target is None else str(target),
+    )
+    started_at = time.time()
+    started_ns = time.perf_counter_ns()
+    try:
+        yield event
+    except BaseException:
+        event.outcome = "error"
+        raise
+    finally:
+        if _events_file is not None:
+            duration_us = (time.perf_counter_ns() - started_ns) // 1000
+            event_line = json.dumps(
+                {
+                    "host": _HOST_NAME,
+                    "home": str(Path.home()),
+                    "layer": event.layer,
+                    "action": event.action,
+                    "source": event.source,
+                    "target": event.target,
+                    "outcome": event.outcome,
+                    "start": round(started_at, 6),
+                    "duration_us": duration_us,
+                },
+                separators=(",", ":"),
+            )
+            _add_entry((f"{event_line}\n", _events_file, False))
+
+
+##
+## === BACKGROUND WRITER
+##
+
+
+def _add_entry(
+    entry: _LogEntry,
+) -> None:
+    buffered_entries = cast(list[_LogEntry] | None, getattr(_thread_state, "entries", None))
+    if buffered_entries is not None:
+        buffered_entries.append(entry)
+        return
+    _enqueue([entry])
+
+
+def _enqueue(
+    entries: list[_LogEntry],
+) -> None:
+    _ensure_writer_started()
+    ## one queue item per block keeps buffered action output contiguous
+    _log_queue.put(entries)
+
+
+def _ensure_writer_started() -> None:
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is not None:
+            return
+        _writer_thread = threading.Thread(
+            target=_drain_queue,
+            name="log-writer",
+            daemon=True,
+        )
+        _writer_thread.start()
+
+
+def _drain_queue() -> None:
+    while True:
+        item = _log_queue.get()
+        batch: list[_LogEntry] = []
+        flush_requests: list[threading.Event] = []
+        batch_size = 0
+        deadline = time.monotonic() + FLUSH_INTERVAL_SECONDS
+        while True:
+            if isinstance(item, threading.Event):
+                flush_requests.append(item)
+                break
+            batch.extend(item)
+            batch_size += sum(len(log_entry) for log_entry, _, _ in item)
+            remaining_seconds = deadline - time.monotonic()
+            if batch_size >= FLUSH_SIZE_BYTES or remaining_seconds <= 0:
+                break
+            try:
+                item = _log_queue.get(timeout=remaining_seconds)
+            except queue.Empty:
+                break
+        ## the writer must outlive any failure, or every later `flush()` would wait on it in vain
+        try:
+            _write_batch(batch)
+        except Exception as error:
+            _report_write_error(f"could not write log entries: {error!r}")
+        finally:
+            for flush_request in flush_requests:
+                flush_request.set()
+
+
+def _write_batch(
+    batch: list[_LogEntry],
+) -> None:
+    if not batch:
+        return
+    ## entries end in a newline and are printed with a blank line after each
+    printed_entries = [f"{log_entry}\n" for log_entry, _, should_print in batch if should_print]
+    if printed_entries:
+        sys.stdout.write("".join(printed_entries))
+        sys.stdout.flush()
+    entries_by_file: dict[Path, list[str]] = {}
+    indexed_files: set[Path] = set()
+    for log_entry, log_file, should_print in batch:
+        if log_file is None:
+            continue
+        ## only human-readable logs are rotated and indexed; event sinks stay plain JSONL
+        if should_print:
+            indexed_files.add(log_file)
+            ## concurrent runs interleave in one file, so every entry names the run that wrote it
+            log_entry = log_entry.replace("] (", f"] [{_run_id}] (", 1)
+        entries_by_file.setdefault(log_file, []).append(log_entry)
+    for log_file, log_entries in entries_by_file.items():
+        try:
+            handle = _open_log_files.get(log_file)
+            if handle is None:
+                handle = _open_log_file(
+                    log_file=log_file,
+                    is_indexed=log_file in indexed_files,
+                )
+                _open_log_files[log_file] = handle
+            ## one append-mode write per batch keeps lines whole when several processes share a file
+            handle.write("".join(log_entries).encode("utf-8"))
+            handle.flush()
+        except OSError as error:
+            ## entries for a file that cannot be written are dropped; they were already printed
+            if log_file not in _failed_log_files:
+                _failed_log_files.add(log_file)
+                _report_write_error(f"could not write to {log_file}: {error}")
+
+
+def _report_write_error(
+    message: str,
+) -> None:
+    try:
+        sys.stderr.write(f"[{get_timestamp()}] ({Path(__file__).name}): {message}\n")
+        sys.stderr.flush()
+    except (OSError, ValueError):
+        pass
+
+
+def _open_log_file(
+    *,
+    log_file: Path,
+    is_indexed: bool,
+) -> BinaryIO:
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    if not is_indexed:
+        return open(log_file, "ab")
+    ## every process writing the log holds a shared lock for as long as its handle is open, so a log is only
+    ## rotated, under the exclusive lock, when no other process could still be appending to it
+    lock_handle = open(get_lock_file(log_file), "ab")
+    _open_lock_files[log_file] = lock_handle
+    if _is_rotation_due(log_file):
+        try:
+            fcntl.flock(lock_handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            pass
+        else:
+            ## checked again under the lock, since another process may have rotated it meanwhile
+            if _is_rotation_due(log_file):
+                _rotate_log_file(log_file)
+    fcntl.flock(lock_handle, fcntl.LOCK_SH)
+    handle = open(log_file, "ab")
+    ## append mode positions at the end, so this is where this run's entries begin
+    run_offset = handle.tell()
+    timestamp = get_timestamp()
+    handle.write(f"[{timestamp}] [{_run_id}] ({Path(__file__).name}): === run {_run_id} ===\n".encode("utf-8"))
+    with open(get_index_file(log_file), "a", encoding="utf-8") as index_handle:
+        index_handle.write(f"{_run_id}\t{timestamp}\t{run_offset}\n")
+    return handle
+
+
+##
+## === ROTATION
+##
+
+
+def get_index_file(
+    log_file: Path,
+) -> Path:
+    """Return the sidecar index of `log_file`: one `run id, start timestamp, byte offset` line per run."""
+    return log_file.with_name(f"{log_file.name}.idx")
+
+
+def get_lock_file(
+    log_file: Path,
+) -> Path:
+    return log_file.with_name(f"{log_file.name}.lock")
+
+
+def read_run_index(
+    log_file: Path,
+) -> list[tuple[str, str, int]]:
+    """Return `(run id, start timestamp, byte offset)` for every run in the active log, oldest first."""
+    index_file = get_index_file(log_file)
+    if not index_file.is_file():
+        return []
+    run_index: list[tuple[str, str, int]] = []
+    for line in index_file.read_text(encoding="utf-8").splitlines():
+        fields = line.split("\t")
+        if len(fields) == 3 and fields[2].isdigit():
+            run_index.append((fields[0], fields[1], int(fields[2])))
+    return run_index
+
+
+def _is_rotation_due(
+    log_file: Path,
+) -> bool:
+    try:
+        log_size = log_file.stat().st_size
+    except FileNotFoundError:
+        return False
+    if log_size >= MAX_LOG_BYTES:
+        return True
+    run_index = read_run_index(log_file)
+    if not run_index:
+        return False
+    try:
+        first_run_time = datetime.datetime.strptime(run_index[0][1], TIMESTAMP_FORMAT)
+    except ValueError:
+        return False
+    return datetime.datetime.now() - first_run_time >= datetime.timedelta(days=MAX_LOG_AGE_DAYS)
+
+
+def _rotate_log_file(
+    log_file: Path,
+) -> None:
+    """
+  Compress the active log into a timestamped `.gz` archive beside it and prune the oldest archives.
+
+  Call with the exclusive lock on `get_lock_file(log_file)` held, so no other process still appends to the log.
+  """
+    rotating_file = log_file.with_name(f".{log_file.name}.{os.getpid()}.rotating")
+    try:
+        log_file.rename(rotating_file)
+    except FileNotFoundError:
+        return
+    get_index_file(log_file).unlink(missing_ok=True)
+    archive_file = log_file.with_name(f"{log_file.stem}.{_run_id}{log_file.suffix}.gz")
+    with open(rotating_file, "rb") as source_handle, gzip.open(archive_file, "wb") as archive_handle:
+        shutil.copyfileobj(source_handle, archive_handle)
+    rotating_file.unlink()
+    archive_files = sorted(log_file.parent.glob(f"{log_file.stem}.*{log_file.suffix}.gz"))
+    for stale_archive_file in archive_files[:-MAX_LOG_ARCHIVES]:
+        stale_archive_file.unlink(missing_ok=True)
+
+
+def _close_log_files() -> None:
+    flush()
+    for handle in [*_open_log_files.values(), *_open_lock_files.values()]:
+        try:
+            handle.close()
+        except OSError:
+            pass
+    _open_log_files.clear()
+    _open_lock_files.clear()
+
+
+def _reset_after_fork() -> None:
+    global _log_queue, _writer_thread, _writer_lock, _run_id
+    ## the writer thread does not survive `fork`; the child starts its own on first use
+    _log_queue = queue.SimpleQueue()
+    _writer_thread = None
+    _writer_lock = threading.Lock()
+    _open_log_files.clear()
+    _open_lock_files.clear()
+    _failed_log_files.clear()
+    ## a forked child writes its own entries, so it gets its own run in the index
+    _run_id = f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+
+
+atexit.register(_close_log_files)
+os.register_at_fork(after_in_child=_reset_after_fork)
+
 ## } MODULE
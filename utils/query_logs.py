@@ -0,0 +1,205 @@
+## { SCRIPT
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+import argparse
+import bisect
+from collections.abc import Iterator
+import mmap
+from pathlib import Path
+import re
+import sys
+from typing import cast
+
+## local
+from utils import log_messages
+
+##
+## === QUERY FUNCTIONS
+##
+
+
+_ENTRY_START_PATTERN = re.compile(rb"\[\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\] ")
+
+
+def find_run(
+    *,
+    run_index: list[tuple[str, str, int]],
+    run_id: str,
+) -> tuple[str, int]:
+    """
+  Return the full id of one run and the offset of its header in the active log.
+
+  `run_id` may be a unique prefix, or `last` for the most recent run.
+  """
+    if not run_index:
+        raise KeyError("the active log has no indexed runs.")
+    if run_id == "last":
+        position = len(run_index) - 1
+    else:
+        positions = [
+            position for position, (indexed_run_id, _, _) in enumerate(run_index)
+            if indexed_run_id.startswith(run_id)
+        ]
+        if len(positions) != 1:
+            raise KeyError(f"`{run_id}` matches {len(positions)} run(s); use `--list-runs` to see run ids.")
+        position = positions[0]
+    return run_index[position][0], run_index[position][2]
+
+
+def iter_run_entries(
+    *,
+    log_view: mmap.mmap,
+    run_id: str,
+    start_offset: int,
+) -> Iterator[bytes]:
+    """
+  Yield every entry of one run from `start_offset` on, including the continuation lines of multi-line messages.
+
+  Processes sharing the log interleave their entries, so entries are picked by the run id each one carries rather
+  than sliced out as one span.
+  """
+    run_tag = f"] [{run_id}] (".encode("utf-8")
+    match_offset = log_view.find(run_tag, start_offset)
+    while match_offset != -1:
+        entry_start = log_view.rfind(b"\n", 0, match_offset) + 1
+        entry_end = log_view.find(b"\n", match_offset)
+        ## a line that does not open with a timestamp continues the entry above it
+        while entry_end != -1 and entry_end + 1 < len(log_view):
+            if _ENTRY_START_PATTERN.match(log_view, entry_end + 1):
+                break
+            entry_end = log_view.find(b"\n", entry_end + 1)
+        if entry_end == -1:
+            entry_end = len(log_view)
+        yield log_view[entry_start:entry_end + 1]
+        match_offset = log_view.find(run_tag, entry_end)
+
+
+def find_since_offset(
+    *,
+    run_index: list[tuple[str, str, int]],
+    since: str,
+) -> int:
+    """Return the offset of the first run that started at or after `since`; timestamps sort lexically."""
+    timestamps = [timestamp for _, timestamp, _ in run_index]
+    position = bisect.bisect_left(timestamps, since)
+    if position == len(run_index):
+        return -1
+    return run_index[position][2]
+
+
+def iter_matching_lines(
+    *,
+    log_view: mmap.mmap,
+    needle: bytes,
+    start_offset: int,
+    end_offset: int,
+) -> Iterator[bytes]:
+    """Yield each whole log line in `[start, end)` that contains `needle`, jumping between matches with `find`."""
+    match_offset = log_view.find(needle, start_offset, end_offset)
+    while match_offset != -1:
+        line_start = log_view.rfind(b"\n", start_offset, match_offset) + 1
+        line_start = max(line_start, start_offset)
+        line_end = log_view.find(b"\n", match_offset, end_offset)
+        if line_end == -1:
+            line_end = end_offset
+        yield log_view[line_start:line_end]
+        match_offset = log_view.find(needle, line_end, end_offset)
+
+
+##
+## === PROGRAM MAIN
+##
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Query the active dotfiles log through its run index without reading the whole file.",
+    )
+    query_group = parser.add_mutually_exclusive_group(required=True)
+    query_group.add_argument(
+        "--list-runs",
+        action="store_true",
+        help="List indexed runs with their start times",
+    )
+    query_group.add_argument(
+        "--run",
+        metavar="RUN_ID",
+        help="Print every entry logged by one run; accepts a unique prefix or `last`",
+    )
+    query_group.add_argument(
+        "--path",
+        type=Path,
+        metavar="PATH",
+        help="Print every entry that mentions PATH",
+    )
+    parser.add_argument(
+        "--since",
+        metavar="TIMESTAMP",
+        help="With `--path`, only search runs started at or after `YYYY-MM-DD HH:MM:SS`",
+    )
+    parser.add_argument(
+        "--log-file",
+        type=Path,
+        default=log_messages.LOG_FILE,
+        metavar="FILE",
+        help="Query FILE instead of ~/dotfiles_log.txt",
+    )
+    args = parser.parse_args()
+    log_file = cast(Path, args.log_file)
+    search_path = cast(Path | None, args.path)
+    since = cast(str | None, args.since)
+    if since is not None and search_path is None:
+        parser.error("`--since` only applies to `--path`")
+    run_index = log_messages.read_run_index(log_file)
+    if cast(bool, args.list_runs):
+        for run_id, timestamp, _ in run_index:
+            print(f"{timestamp}  {run_id}")
+        return
+    if not log_file.is_file() or log_file.stat().st_size == 0:
+        parser.error(f"no log entries in {log_file}")
+    with open(log_file, "rb") as log_handle, mmap.mmap(log_handle.fileno(), 0, access=mmap.ACCESS_READ) as log_view:
+        run_id = cast(str | None, args.run)
+        if run_id is not None:
+            try:
+                full_run_id, start_offset = find_run(
+                    run_index=run_index,
+                    run_id=run_id,
+                )
+            except KeyError as error:
+                parser.error(cast(str, error.args[0]))
+            for entry in iter_run_entries(
+                    log_view=log_view,
+                    run_id=full_run_id,
+                    start_offset=start_offset,
+            ):
+                sys.stdout.buffer.write(entry)
+            return
+        start_offset = 0
+        if since is not None:
+            start_offset = find_since_offset(
+                run_index=run_index,
+                since=since,
+            )
+            if start_offset < 0:
+                return
+        for line in iter_matching_lines(
+                log_view=log_view,
+                needle=str(cast(Path, search_path).expanduser()).encode("utf-8"),
+                start_offset=start_offset,
+                end_offset=len(log_view),
+        ):
+            sys.stdout.buffer.write(line + b"\n")
+
+
+##
+## === ENTRY POINT
+##
+
+if __name__ == "__main__":
+    main()
+
+## } SCRIPT
@@ -0,0 +1,211 @@
+## { MODULE
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+from dataclasses import dataclass
+from enum import Enum
+import json
+import os
+from pathlib import Path
+import stat
+import threading
+from typing import cast
+
+## local
+from utils import write_files
+
+##
+## === MODULE CONFIG
+##
+
+STATE_DIR = Path(os.environ.get("XDG_STATE_HOME") or Path.home() / ".local" / "state") / "dotfiles"
+MANIFEST_FILE = STATE_DIR / "links.json"
+MANIFEST_VERSION = 1
+
+_manifest_lock = threading.Lock()  # scheduled actions update the manifest from worker threads
+
+##
+## === MANIFEST TYPES
+##
+
+
+class LinkStatus(str, Enum):
+    OK = "ok"
+    MISSING = "missing"
+    CHANGED = "changed"
+    SOURCE_MISSING = "source missing"
+
+
+@dataclass(frozen=True)
+class LinkRecord:
+    """
+  One symlink created (or confirmed) by a setup layer.
+
+  Fields
+  ---
+  - `layer`:
+      Script name of the layer that owns the link, e.g. `rules.py`.
+
+  - `inode`, `mtime_ns`:
+      `os.lstat` of the symlink itself when it was recorded; a mismatch means it was replaced since.
+  """
+
+    layer: str
+    source_path: Path
+    target_path: Path
+    inode: int
+    mtime_ns: int
+
+##
+## === MANIFEST FUNCTIONS
+##
+
+
+def manifest_exists(
+    *,
+    manifest_file: Path | None = None,
+) -> bool:
+    """Return `True` iff a link manifest has been written on this system."""
+    return (manifest_file or MANIFEST_FILE).is_file()
+
+
+def load_manifest(
+    *,
+    manifest_file: Path | None = None,
+) -> dict[Path, LinkRecord]:
+    """Load recorded links keyed by target path; a missing or unreadable manifest is empty."""
+    manifest_file = manifest_file or MANIFEST_FILE
+    try:
+        raw_manifest = cast(dict[str, object], json.loads(manifest_file.read_text(encoding="utf-8")))
+    except (OSError, ValueError):
+        return {}
+    if raw_manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    raw_links = cast(dict[str, list[object]], raw_manifest.get("links", {}))
+    records: dict[Path, LinkRecord] = {}
+    for target_name, (layer, source_name, inode, mtime_ns) in raw_links.items():
+        target_path = Path(target_name)
+        records[target_path] = LinkRecord(
+            layer=cast(str, layer),
+            source_path=Path(cast(str, source_name)),
+            target_path=target_path,
+            inode=cast(int, inode),
+            mtime_ns=cast(int, mtime_ns),
+        )
+    return records
+
+
+def get_layer_records(
+    *,
+    layer: str,
+    manifest_file: Path | None = None,
+) -> list[LinkRecord]:
+    """Return the recorded links owned by one layer, sorted by target path."""
+    records = load_manifest(manifest_file=manifest_file).values()
+    return sorted(
+        (record for record in records if record.layer == layer),
+        key=lambda record: record.target_path,
+    )
+
+
+def get_orphaned_targets(
+    *,
+    layer: str,
+    known_targets: set[Path],
+    manifest_file: Path | None = None,
+) -> list[Path]:
+    """Return targets recorded for `layer` that no current registry entry produces."""
+    return [
+        record.target_path
+        for record in get_layer_records(
+            layer=layer,
+            manifest_file=manifest_file,
+        )
+        if record.target_path not in known_targets
+    ]
+
+
+def update_manifest(
+    *,
+    added: list[LinkRecord] | None = None,
+    removed: list[Path] | None = None,
+    manifest_file: Path | None = None,
+) -> None:
+    """Add and drop records in one read-modify-write of the manifest."""
+    if not added and not removed:
+        return
+    manifest_file = manifest_file or MANIFEST_FILE
+    with _manifest_lock:
+        records = load_manifest(manifest_file=manifest_file)
+        for target_path in removed or []:
+            records.pop(target_path, None)
+        for record in added or []:
+            records[record.target_path] = record
+        _write_manifest(
+            records=records,
+            manifest_file=manifest_file,
+        )
+
+
+def create_record(
+    *,
+    layer: str,
+    source_path: Path,
+    target_path: Path,
+    lstat_result: os.stat_result | None = None,
+) -> LinkRecord:
+    """Create a record for an existing symlink; pass `lstat_result` to reuse a snapshot."""
+    if lstat_result is None:
+        lstat_result = os.lstat(target_path)
+    return LinkRecord(
+        layer=layer,
+        source_path=source_path,
+        target_path=target_path,
+        inode=lstat_result.st_ino,
+        mtime_ns=lstat_result.st_mtime_ns,
+    )
+
+
+def check_record(
+    record: LinkRecord,
+) -> LinkStatus:
+    """Compare one recorded link against the filesystem without walking any directory."""
+    try:
+        lstat_result = os.lstat(record.target_path)
+    except OSError:
+        return LinkStatus.MISSING
+    if not stat.S_ISLNK(lstat_result.st_mode):
+        return LinkStatus.CHANGED
+    ## symlinks are never modified in place, so an unchanged inode and mtime means an unchanged link
+    is_same_link = (lstat_result.st_ino, lstat_result.st_mtime_ns) == (record.inode, record.mtime_ns)
+    if not is_same_link and os.readlink(record.target_path) != str(record.source_path):
+        return LinkStatus.CHANGED
+    if not record.source_path.exists():
+        return LinkStatus.SOURCE_MISSING
+    return LinkStatus.OK
+
+
+def _write_manifest(
+    *,
+    records: dict[Path, LinkRecord],
+    manifest_file: Path,
+) -> None:
+    raw_links = {
+        str(target_path): [record.layer, str(record.source_path), record.inode, record.mtime_ns]
+        for target_path, record in sorted(records.items())
+    }
+    write_files.write_file_atomically(
+        manifest_file,
+        content=json.dumps(
+            {
+                "version": MANIFEST_VERSION,
+                "links": raw_links,
+            },
+            separators=(",", ":"),
+        ),
+    )
+
+## } MODULE
@@ -0,0 +1,187 @@
+## { MODULE
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+from collections import Counter, deque
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+import os
+from pathlib import Path
+
+## local
+from utils import log_messages
+
+##
+## === MODULE CONFIG
+##
+
+SCRIPT_NAME = Path(__file__).name
+DEFAULT_MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+_log_message = log_messages.make_logger(SCRIPT_NAME)
+
+##
+## === ACTION TYPES
+##
+
+
+@dataclass(frozen=True)
+class Action:
+    """
+  One unit of setup work and the actions that must finish before it starts.
+
+  Fields
+  ---
+  - `name`:
+      Unique across one scheduler run; namespaced by layer, e.g. `tools:tmux:clone`.
+
+  - `run`:
+      Returning `False` marks the action failed; every action that depends on it is skipped.
+
+  - `exclusive`:
+      Run with no other action in flight, e.g. commands that prompt on the terminal.
+  """
+
+    name: str
+    run: Callable[[], bool | None]
+    depends_on: tuple[str, ...] = ()
+    exclusive: bool = False
+
+##
+## === SCHEDULER
+##
+
+
+def run_actions(
+    *,
+    actions: list[Action],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> None:
+    """
+  Run actions on a bounded thread pool as soon as their dependencies have succeeded.
+
+  Each action's log lines are buffered and emitted together when it finishes, so output stays grouped per
+  action. An exception inside an action is logged, its dependents are skipped, and the first one is re-raised
+  once every independent action has finished.
+  """
+    if max_workers < 1:
+        raise ValueError(f"`max_workers` must be positive; got `{max_workers}`.")
+    _ensure_valid_graph(actions)
+    actions_by_name = {action.name: action for action in actions}
+    dependents: dict[str, list[str]] = {action.name: [] for action in actions}
+    remaining_dependencies: dict[str, int] = {}
+    for action in actions:
+        remaining_dependencies[action.name] = len(set(action.depends_on))
+        for dependency_name in set(action.depends_on):
+            dependents[dependency_name].append(action.name)
+    ready = deque(action.name for action in actions if remaining_dependencies[action.name] == 0)
+    skipped: set[str] = set()
+    errors: list[tuple[str, Exception]] = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running: dict[Future[tuple[bool, Exception | None]], Action] = {}
+        while ready or running:
+            while ready and len(running) < max_workers:
+                next_action = actions_by_name[ready[0]]
+                is_blocked = any(action.exclusive for action in running.values())
+                if is_blocked or (next_action.exclusive and running):
+                    break
+                ready.popleft()
+                running[executor.submit(_run_action, next_action)] = next_action
+            done_futures, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                action = running.pop(future)
+                succeeded, error = future.result()
+                if error is not None:
+                    errors.append((action.name, error))
+                if not succeeded:
+                    _skip_dependents(
+                        failed_name=action.name,
+                        dependents=dependents,
+                        skipped=skipped,
+                    )
+                    continue
+                for dependent_name in dependents[action.name]:
+                    remaining_dependencies[dependent_name] -= 1
+                    if remaining_dependencies[dependent_name] == 0 and dependent_name not in skipped:
+                        ready.append(dependent_name)
+    if errors:
+        failed_name, error = errors[0]
+        raise RuntimeError(f"`{failed_name}` failed.") from error
+
+
+def _run_action(
+    action: Action,
+) -> tuple[bool, Exception | None]:
+    with log_messages.buffer_messages():
+        with log_messages.timed_event(
+            layer=action.name.split(":", 1)[0],
+            action=action.name,
+        ) as event:
+            try:
+                succeeded = action.run() is not False
+            except Exception as error:
+                _log_message(f"Failed: {action.name}: {error}")
+                event.outcome = "error"
+                return False, error
+            if not succeeded:
+                event.outcome = "failed"
+            return succeeded, None
+
+
+def _skip_dependents(
+    *,
+    failed_name: str,
+    dependents: dict[str, list[str]],
+    skipped: set[str],
+) -> None:
+    for dependent_name in dependents[failed_name]:
+        if dependent_name in skipped:
+            continue
+        skipped.add(dependent_name)
+        _log_message(f"Skipping {dependent_name}; dependency {failed_name} did not succeed.")
+        with log_messages.timed_event(
+            layer=dependent_name.split(":", 1)[0],
+            action=dependent_name,
+        ) as event:
+            event.outcome = "skipped"
+        _skip_dependents(
+            failed_name=dependent_name,
+            dependents=dependents,
+            skipped=skipped,
+        )
+
+
+def _ensure_valid_graph(
+    actions: list[Action],
+) -> None:
+    name_counts = Counter(action.name for action in actions)
+    duplicate_names = sorted(name for name, count in name_counts.items() if count > 1)
+    if duplicate_names:
+        raise ValueError(f"action names must be unique; got duplicates: {', '.join(duplicate_names)}.")
+    dependents: dict[str, list[str]] = {action.name: [] for action in actions}
+    for action in actions:
+        unknown_names = sorted(set(action.depends_on) - set(name_counts))
+        if unknown_names:
+            raise ValueError(f"`{action.name}` depends on unknown action(s): {', '.join(unknown_names)}.")
+        for dependency_name in set(action.depends_on):
+            dependents[dependency_name].append(action.name)
+    ## Kahn's algorithm: anything never reaching zero in-degree sits on a cycle
+    in_degree = {action.name: len(set(action.depends_on)) for action in actions}
+    queue = deque(name for name, degree in in_degree.items() if degree == 0)
+    visited_count = 0
+    while queue:
+        name = queue.popleft()
+        visited_count += 1
+        for dependent_name in dependents[name]:
+            in_degree[dependent_name] -= 1
+            if in_degree[dependent_name] == 0:
+                queue.append(dependent_name)
+    if visited_count != len(actions):
+        cyclic_names = sorted(name for name, degree in in_degree.items() if degree > 0)
+        raise ValueError(f"action dependencies form a cycle through: {', '.join(cyclic_names)}.")
+
+## } MODULE
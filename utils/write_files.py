@@ -0,0 +1,82 @@
+## { MODULE
+
+##
+## === DEPENDENCIES
+##
+
+## stdlib
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+
+##
+## === MODULE CONFIG
+##
+
+## `os.umask` can only be read by setting it, so it is read once at import, before any worker thread starts
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+## the mode `open` would give a new file; `mkstemp` always creates 0600
+DEFAULT_FILE_MODE = 0o666 & ~_UMASK
+
+##
+## === WRITE FUNCTIONS
+##
+
+
+def write_file_atomically(
+    path: Path,
+    *,
+    content: str | bytes,
+) -> None:
+    """
+  Write `content` to a temporary sibling file, then swap it into place with `os.replace`.
+
+  Readers only ever see the old file or the complete new one. An existing file keeps its permissions, and a new
+  one gets the umask's default, as if it had been created with `open`.
+  """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temp_name = tempfile.mkstemp(
+        dir=path.parent,
+        prefix=f".{path.name}.",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(file_descriptor, "wb") as f:
+            f.write(content.encode("utf-8") if isinstance(content, str) else content)
+        try:
+            file_mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            file_mode = DEFAULT_FILE_MODE
+        os.chmod(temp_name, file_mode)
+        os.replace(temp_name, path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+def write_file_if_changed(
+    path: Path,
+    *,
+    content: str,
+) -> bool:
+    """
+  Atomically replace `path` with `content` only when their hashes differ; return `True` if it was written.
+
+  Skipping identical content keeps the file's inode and mtime, so file watchers see no change event.
+  """
+    new_digest = hashlib.sha256(content.encode("utf-8")).digest()
+    try:
+        old_digest = hashlib.sha256(path.read_bytes()).digest()
+    except FileNotFoundError:
+        old_digest = None
+    if old_digest == new_digest:
+        return False
+    write_file_atomically(
+        path,
+        content=content,
+    )
+    return True
+
+## } MODULE